@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for directory in ('cezer', 'otp', 'otp-vigenere', 'languages'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+import cezar
+import cryptoanalysis
+import otp
+from keystream import apply_key
+from profiles import BYTE_ALPHABET, get_profile
+
+DEFAULT_SIZES = (1 << 16, 1 << 20, 1 << 22)
+
+
+def generate_corpus(size, language='english', seed=0):
+    """Random text of size characters drawn from a language's letter and space frequencies."""
+    rng = np.random.default_rng(seed)
+    symbols = np.frombuffer(BYTE_ALPHABET.encode('ascii'), dtype=np.uint8)
+    text = rng.choice(symbols, size=size, p=get_profile(language).byte_expected)
+    return text.tobytes().decode('ascii')
+
+
+def measure(function, repeat):
+    """Best wall time over repeat runs, then peak traced memory of one more run."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def cases(size, language, key_length, max_key_length, seed):
+    """The benchmarked calls for one input size, as (name, callable) pairs."""
+    text = generate_corpus(size, language, seed)
+    key = np.random.default_rng(seed + 1).integers(0, 256, key_length, dtype=np.uint8).tobytes()
+    encrypted = apply_key(text.encode('ascii'), key)
+    return [
+        ('caesar_cipher', lambda: cezar.caesar_cipher(text, 3)),
+        ('frequency_table', lambda: cezar.frequency_table(text)),
+        ('otp.encrypt', lambda: otp.encrypt(text, key)),
+        ('otp.decrypt', lambda: otp.decrypt(encrypted, key)),
+        ('estimate_key_length', lambda: cryptoanalysis.estimate_key_length(encrypted, max_key_length)),
+        ('recover_key', lambda: cryptoanalysis.recover_key(encrypted, key_length)),
+        ('decrypt_with_key', lambda: cryptoanalysis.decrypt_with_key(encrypted, key)),
+    ]
+
+
+def run(sizes, language, key_length, max_key_length, repeat, seed, only=None):
+    results = []
+    for size in sizes:
+        for name, function in cases(size, language, key_length, max_key_length, seed):
+            if only and name not in only:
+                continue
+            seconds, peak = measure(function, repeat)
+            results.append({'name': name, 'size': size, 'seconds': seconds,
+                            'mb_per_s': size / seconds / 1e6 if seconds else float('inf'),
+                            'peak_bytes': peak})
+            print(f"{name:<22}{size:>10} B {seconds * 1000:>10.2f} ms "
+                  f"{results[-1]['mb_per_s']:>9.2f} MB/s {peak / 1e6:>9.2f} MB peak", flush=True)
+    return results
+
+
+def parameter_mismatches(baseline, parameters):
+    """Parameters that differ from the ones the baseline was recorded with, or that it lacks."""
+    recorded = baseline.get('parameters', {})
+    return sorted(name for name in parameters if recorded.get(name) != parameters[name])
+
+
+def compare(results, baseline, tolerance, parameters=None):
+    """Results whose time grew by more than tolerance over the baseline entry.
+
+    Timings only compare under the same inputs, so a baseline recorded with
+    other parameters raises ValueError.
+    """
+    mismatches = parameter_mismatches(baseline, parameters or {})
+    if mismatches:
+        raise ValueError(f"baseline was recorded with different {', '.join(mismatches)}")
+    previous = {(entry['name'], entry['size']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry['name'], entry['size']))
+        if old and entry['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append((entry, old))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every cipher and attack stage on synthetic text.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="input sizes in bytes")
+    parser.add_argument('--language', default='english')
+    parser.add_argument('--key-length', type=int, default=25)
+    parser.add_argument('--max-key-length', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help="benchmark names to run")
+    parser.add_argument('--save-baseline', metavar='PATH', help="store the results as a baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="flag regressions against a stored baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    parameters = {'language': args.language, 'key_length': args.key_length,
+                  'max_key_length': args.max_key_length, 'seed': args.seed}
+
+    baseline = None
+    if args.baseline:
+        # Checked before running anything, so a mismatched baseline fails fast
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatches = parameter_mismatches(baseline, parameters)
+        if mismatches:
+            recorded = baseline.get('parameters', {})
+            parser.error("baseline parameters differ: " + ", ".join(
+                f"{name} {recorded.get(name)!r} != {parameters[name]!r}" for name in mismatches))
+
+    results = run(args.sizes, args.language, args.key_length, args.max_key_length,
+                  args.repeat, args.seed, args.only)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'parameters': parameters,
+                       'results': results}, f, indent=1)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, parameters)
+        for entry, old in regressions:
+            print(f"REGRESSION {entry['name']} at {entry['size']} B: "
+                  f"{old['seconds'] * 1000:.2f} ms -> {entry['seconds'] * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,116 @@
-import matplotlib.pyplot as plt
+import functools
+import os
+import sys
 from collections import Counter
 
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'languages'))
+from profiles import char_weight_matrix, get_profile
+
 # Spanish letter probabilities
-# https://www.sttmedia.com/characterfrequency-spanish
-spanish_frequencies = {
-    'A': 11.72, 'Á': 0.44, 'B': 1.49, 'C': 3.87, 'D': 4.67, 'E': 13.72, 
-    'É': 0.36, 'F': 0.69, 'G': 1.00, 'H': 1.18, 'I': 5.28, 'Í': 0.70, 
-    'J': 0.52, 'K': 0.11, 'L': 5.24, 'M': 3.08, 'N': 6.83, 'Ñ': 0.17, 
-    'O': 8.44, 'Ó': 0.76, 'P': 2.89, 'Q': 1.11, 'R': 6.41, 'S': 7.20, 
-    'T': 4.60, 'U': 4.55, 'Ü': 0.02, 'Ú': 0.12, 'V': 1.05, 'W': 0.04, 
-    'X': 0.14, 'Y': 1.09, 'Z': 0.47
-}
-
-def caesar_cipher(text, shift, encrypt=True):
+spanish_frequencies = get_profile('spanish').unigrams
+
+UNICODE_SIZE = 1114112  # Number of Unicode code points
+UPPERCASE_SHARE = 0.05  # Rough share of capital letters in running text
+LETTER_FLOOR = 1e-4  # Probability given to characters that are not letters of a language
+SHIFT_TABLE_MEMO = 4096  # Characters remembered per ShiftTable; rarer ones are recomputed
+
+
+class ShiftTable(dict):
+    """
+    Translation table for str.translate that shifts printable code points.
+
+    Entries are computed the first time a character is looked up and kept,
+    so each distinct character is classified only once per table. Only the
+    first SHIFT_TABLE_MEMO distinct characters are kept, which bounds the
+    memory of the cached tables however many code points a text uses.
+    """
+
+    def __init__(self, shift):
+        super().__init__()
+        self.shift = shift
+
+    def __missing__(self, code):
+        char = chr(code)
+        # Storing the result as a string is faster for str.translate than an int
+        new_char = chr((code + self.shift) % UNICODE_SIZE) if char.isprintable() else char
+        if len(self) < SHIFT_TABLE_MEMO:
+            self[code] = new_char
+        return new_char
+
+
+@functools.lru_cache(maxsize=128)
+def translation_table(shift, alphabet=None):
+    """
+    Build (and cache) the translation table for a shift.
+
+    :param shift: The number of positions to shift, already reduced modulo the alphabet size
+    :param alphabet: String of characters to rotate within, or None to shift every
+                     printable Unicode code point
+    :return: A table usable with str.translate
+    """
+    if alphabet is None:
+        return ShiftTable(shift)
+    return str.maketrans(alphabet, alphabet[shift:] + alphabet[:shift])
+
+
+def alphabet_size(alphabet=None):
+    """
+    Number of positions a shift wraps around.
+
+    :param alphabet: String of characters to rotate within, or None for every Unicode code point
+    :return: The alphabet size
+    :raises ValueError: If the alphabet is empty
+    """
+    if alphabet is None:
+        return UNICODE_SIZE
+    if not alphabet:
+        raise ValueError("alphabet must contain at least one character")
+    return len(alphabet)
+
+
+def caesar_cipher(text, shift, encrypt=True, alphabet=None):
     """
     Apply Caesar Cipher to the given text.
 
     :param text: The input string to be encrypted/decrypted
     :param shift: The number of positions to shift
     :param encrypt: True for encryption, False for decryption
+    :param alphabet: Optional string of characters to rotate within; by default every
+                     printable character is shifted by its Unicode code point
     :return: The encrypted/decrypted string
     """
     if not encrypt:
         shift = -shift  # Reverse shift for decryption
 
-    result = []
-    for char in text:
-        if char.isprintable():
-            # Shift character by converting to its Unicode code point
-            new_char = chr((ord(char) + shift) % 1114112)  # Modulus for UTF-8 range
-            result.append(new_char)
-        else:
-            # Append non-printable characters as is
-            result.append(char)
-    
-    return ''.join(result)
+    size = alphabet_size(alphabet)
+    return text.translate(translation_table(shift % size, alphabet))
+
+
+def caesar_file(input_path, output_path, shift, encrypt=True, alphabet=None, chunk_size=1 << 20):
+    """
+    Apply Caesar Cipher to a UTF-8 text file chunk by chunk.
+
+    The text-mode reader decodes incrementally, so a multi-byte character split
+    across two reads is never cut in half, and memory stays bounded by chunk_size.
+
+    :param input_path: Path of the file to read
+    :param output_path: Path of the file to write
+    :param shift: The number of positions to shift
+    :param encrypt: True for encryption, False for decryption
+    :param alphabet: Optional string of characters to rotate within
+    :param chunk_size: Number of characters processed per read
+    """
+    alphabet_size(alphabet)  # Fail before the output file is created
+    # surrogatepass lets shifted text that lands on surrogate code points round-trip
+    with open(input_path, encoding='utf-8', errors='surrogatepass', newline='') as source, \
+            open(output_path, 'w', encoding='utf-8', errors='surrogatepass', newline='') as target:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            target.write(caesar_cipher(chunk, shift, encrypt, alphabet))
 
 def frequency_table(text):
     """
@@ -53,6 +129,53 @@ def frequency_table(text):
     return freq
 
 
+def auto_crack(text, language='spanish', top=5):
+    """
+    Rank candidate shifts by how well the shifted-back text matches language profiles.
+
+    Every candidate shift is scored against every requested language at once by
+    the log-likelihood of the shifted-back letters under the language's letter
+    frequencies, relative to a small floor probability for characters that are
+    not letters of that language. Only shifts that line up at least one profile
+    letter with a character of the text can score above zero, so just those
+    are tried.
+
+    :param text: The encrypted string
+    :param language: Name of a registered language profile, a list of names, or None
+                     to detect the language among all registered profiles
+    :param top: Number of ranked shifts to return
+    :return: A list of (shift, score, confidence, language) tuples, best first; confidence
+             is how many standard deviations the score sits above the mean candidate score
+    """
+    histogram = Counter(text)  # Shifted letters may land on non-printable code points, so keep them all
+    if not histogram:
+        return []
+    codes = np.array(sorted(ord(char) for char in histogram))
+    counts = np.array([histogram[chr(code)] for code in codes], dtype=np.float64)
+
+    # Running text is mostly lowercase. Giving capitals a small share keeps the
+    # shift 32 code points away (lowercase read as capitals) from tying the real one.
+    names = [language] if isinstance(language, str) else language
+    names, profile_codes, weights = char_weight_matrix(names, UPPERCASE_SHARE)
+
+    shifts = np.unique((codes[:, None] - profile_codes[None, :]) % UNICODE_SIZE)
+    shifted = (profile_codes[None, :] + shifts[:, None]) % UNICODE_SIZE  # (shift, letter)
+    positions = np.minimum(np.searchsorted(codes, shifted), len(codes) - 1)
+    observed = np.where(codes[positions] == shifted, counts[positions], 0.0)
+    probabilities = weights / weights.sum(axis=1, keepdims=True)
+    log_ratios = np.log(np.maximum(probabilities, LETTER_FLOOR) / LETTER_FLOOR)
+    scores = (observed @ log_ratios.T) / counts.sum()  # (shift, language), per character
+
+    spread = scores.std()
+    confidence = (scores - scores.mean()) / spread if spread > 0 else np.zeros_like(scores)
+    ranking = np.argsort(-scores, axis=None, kind='stable')[:top]
+    results = []
+    for flat in ranking:
+        i, j = np.unravel_index(flat, scores.shape)
+        results.append((int(shifts[i]), float(scores[i, j]), float(confidence[i, j]), names[j]))
+    return results
+
+
 def plot_histogram(freq_table, title):
     """
     Plot a histogram from the frequency table.
@@ -60,6 +183,8 @@ def plot_histogram(freq_table, title):
     :param freq_table: A dictionary of character frequencies
     :param title: The title of the histogram
     """
+    import matplotlib.pyplot as plt  # Imported here so headless runs never load matplotlib
+
     characters = list(freq_table.keys())
     frequencies = list(freq_table.values())
 
@@ -73,47 +198,53 @@ def plot_histogram(freq_table, title):
     plt.show()
     plt.savefig(title)
 
-# Input message
-message = '''
+if __name__ == "__main__":
+    # Input message
+    message = '''
 En criptografía, el cifrado César, también conocido como cifrado por desplazamiento, código de César o desplazamiento de César, es una de las técnicas de cifrado más simples y más usadas. Es un tipo de cifrado por sustitución en el que una letra en el texto original es reemplazada por otra letra que se encuentra un número fijo de posiciones más adelante en el alfabeto. Por ejemplo, con un desplazamiento de 3, la A sería sustituida por la D (situada 3 lugares a la derecha de la A), la B sería reemplazada por la E, etc. Este método debe su nombre a Julio César, que lo usaba para comunicarse con sus generales.
 
 El cifrado César muchas veces puede formar parte de sistemas más complejos de codificación, como el cifrado Vigenère, e incluso tiene aplicación en el sistema ROT13. Como todos los cifrados de sustitución alfabética simple, el cifrado César se descifra con facilidad y en la práctica no ofrece mucha seguridad en la comunicación. 
 '''
 
 
-# Caesar Cipher shift value
-shift_value = 3
+    # Caesar Cipher shift value
+    shift_value = 3
+
+    # Frequency Table for Original Message
+    original_freq = frequency_table(message)
 
-# Frequency Table for Original Message
-original_freq = frequency_table(message)
+    # Encrypt the message
+    encrypted = caesar_cipher(message, shift_value)
 
-# Encrypt the message
-encrypted = caesar_cipher(message, shift_value)
+    # Frequency Table for Encrypted Message
+    encrypted_freq = frequency_table(encrypted)
 
-# Frequency Table for Encrypted Message
-encrypted_freq = frequency_table(encrypted)
+    # Decrypt to verify
+    decrypted = caesar_cipher(encrypted, shift_value, encrypt=False)
 
-# Decrypt to verify
-decrypted = caesar_cipher(encrypted, shift_value, encrypt=False)
+    # Print Results
+    print("Original Frequency Table:")
+    for char, freq in original_freq.items():
+        print(f"'{char}': \t{freq} \t ORD value: {ord(char)}")
 
-# Print Results
-print("Original Frequency Table:")
-for char, freq in original_freq.items():
-    print(f"'{char}': \t{freq} \t ORD value: {ord(char)}")
+    print("\nEncrypted Message:")
+    print(encrypted)
 
-print("\nEncrypted Message:")
-print(encrypted)
+    print("\nEncrypted Frequency Table:")
+    for char, freq in encrypted_freq.items():
+        print(f"'{char}': \t{freq} \t ORD value: {ord(char)}")
 
-print("\nEncrypted Frequency Table:")
-for char, freq in encrypted_freq.items():
-    print(f"'{char}': \t{freq} \t ORD value: {ord(char)}")
+    print("\nDecrypted Message:")
+    print(decrypted)
 
-print("\nDecrypted Message:")
-print(decrypted)
+    # Find the shift automatically
+    print("\nMost likely shifts (shift, score, confidence, language):")
+    for shift, score, confidence, language in auto_crack(encrypted, language=None):
+        print(f"{shift}: \t{score:.4f} \t {confidence:.2f} \t {language}")
 
-# Plot Histograms
-plot_histogram(encrypted_freq, "Character Frequency in Encrypted Message")
-plot_histogram(spanish_frequencies, "Spanish Letter Probabilities")
+    # Plot Histograms
+    plot_histogram(encrypted_freq, "Character Frequency in Encrypted Message")
+    plot_histogram(spanish_frequencies, "Spanish Letter Probabilities")
 
 '''
 Result images shows shitft 2 most freq letters in spanish are E and A in histogram of message when we get rid of space are D and H so:
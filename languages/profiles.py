@@ -0,0 +1,254 @@
+import argparse
+import collections
+import json
+import os
+
+import numpy as np
+
+# Symbols the byte-level (XOR/ADD) scorers read decrypted text as: ASCII letters
+# folded to lowercase plus space. Everything else is ignored by the scores.
+BYTE_ALPHABET = 'abcdefghijklmnopqrstuvwxyz '
+DEFAULT_SPACE = 13.0  # Share of spaces assumed for tables that only list letters
+# Byte-level text model used by byte_scores
+CAPITAL_SHARE = 0.03
+PUNCTUATION_SHARE = 0.03  # digits and punctuation together
+NEWLINE_SHARE = 0.01
+NOISE_PROBABILITY = 1e-6  # control bytes and anything outside ASCII
+
+# Letter frequencies in percent
+# https://en.wikipedia.org/wiki/Letter_frequency
+BUILTIN_UNIGRAMS = {
+    'english': {
+        'a': 8.167, 'b': 1.492, 'c': 2.782, 'd': 4.253,
+        'e': 12.702,'f': 2.228, 'g': 2.015, 'h': 6.094,
+        'i': 6.966, 'j': 0.153, 'k': 0.772, 'l': 4.025,
+        'm': 2.406, 'n': 6.749, 'o': 7.507, 'p': 1.929,
+        'q': 0.095, 'r': 5.987, 's': 6.327, 't': 9.056,
+        'u': 2.758, 'v': 0.978, 'w': 2.360, 'x': 0.150,
+        'y': 1.974, 'z': 0.074, ' ': 13.000
+    },
+    # https://www.sttmedia.com/characterfrequency-spanish
+    'spanish': {
+        'A': 11.72, 'Á': 0.44, 'B': 1.49, 'C': 3.87, 'D': 4.67, 'E': 13.72,
+        'É': 0.36, 'F': 0.69, 'G': 1.00, 'H': 1.18, 'I': 5.28, 'Í': 0.70,
+        'J': 0.52, 'K': 0.11, 'L': 5.24, 'M': 3.08, 'N': 6.83, 'Ñ': 0.17,
+        'O': 8.44, 'Ó': 0.76, 'P': 2.89, 'Q': 1.11, 'R': 6.41, 'S': 7.20,
+        'T': 4.60, 'U': 4.55, 'Ü': 0.02, 'Ú': 0.12, 'V': 1.05, 'W': 0.04,
+        'X': 0.14, 'Y': 1.09, 'Z': 0.47
+    },
+    'french': {
+        'a': 7.636, 'b': 0.901, 'c': 3.260, 'd': 3.669, 'e': 14.715,
+        'f': 1.066, 'g': 0.866, 'h': 0.737, 'i': 7.529, 'j': 0.613,
+        'k': 0.074, 'l': 5.456, 'm': 2.968, 'n': 7.095, 'o': 5.796,
+        'p': 2.521, 'q': 1.362, 'r': 6.693, 's': 7.948, 't': 7.244,
+        'u': 6.311, 'v': 1.838, 'w': 0.049, 'x': 0.427, 'y': 0.128,
+        'z': 0.326, 'à': 0.486, 'â': 0.051, 'œ': 0.018, 'ç': 0.085,
+        'è': 0.271, 'é': 1.504, 'ê': 0.218, 'ë': 0.008, 'î': 0.045,
+        'ï': 0.005, 'ô': 0.023, 'ù': 0.058, 'û': 0.060
+    },
+    'german': {
+        'a': 6.516, 'b': 1.886, 'c': 2.732, 'd': 5.076, 'e': 16.396,
+        'f': 1.656, 'g': 3.009, 'h': 4.577, 'i': 6.550, 'j': 0.268,
+        'k': 1.417, 'l': 3.437, 'm': 2.534, 'n': 9.776, 'o': 2.594,
+        'p': 0.670, 'q': 0.018, 'r': 7.003, 's': 7.270, 't': 6.154,
+        'u': 4.166, 'v': 0.846, 'w': 1.921, 'x': 0.034, 'y': 0.039,
+        'z': 1.134, 'ä': 0.578, 'ö': 0.443, 'ß': 0.307, 'ü': 0.995
+    },
+    'italian': {
+        'a': 11.745, 'b': 0.927, 'c': 4.501, 'd': 3.736, 'e': 11.792,
+        'f': 1.153, 'g': 1.644, 'h': 0.636, 'i': 10.143, 'j': 0.011,
+        'k': 0.009, 'l': 6.510, 'm': 2.512, 'n': 6.883, 'o': 9.832,
+        'p': 3.056, 'q': 0.505, 'r': 6.367, 's': 4.981, 't': 5.623,
+        'u': 3.011, 'v': 2.097, 'w': 0.033, 'x': 0.003, 'y': 0.020,
+        'z': 1.181, 'à': 0.635, 'è': 0.263, 'ì': 0.030, 'ò': 0.002,
+        'ù': 0.166
+    },
+    'portuguese': {
+        'a': 14.634, 'b': 1.043, 'c': 3.882, 'd': 4.992, 'e': 12.570,
+        'f': 1.023, 'g': 1.303, 'h': 0.781, 'i': 6.186, 'j': 0.397,
+        'k': 0.015, 'l': 2.779, 'm': 4.738, 'n': 4.446, 'o': 9.735,
+        'p': 2.523, 'q': 1.204, 'r': 6.530, 's': 6.805, 't': 4.336,
+        'u': 3.639, 'v': 1.575, 'w': 0.037, 'x': 0.253, 'y': 0.006,
+        'z': 0.470, 'à': 0.072, 'â': 0.562, 'á': 0.118, 'ã': 0.733,
+        'ç': 0.530, 'é': 0.337, 'ê': 0.450, 'í': 0.132, 'ó': 0.296,
+        'ô': 0.635, 'õ': 0.040, 'ú': 0.207, 'ü': 0.026
+    },
+}
+
+
+class Profile:
+    """Letter statistics of one language, compiled into dense arrays once."""
+
+    def __init__(self, name, unigrams, bigrams=None):
+        self.name = name
+        self.unigrams = dict(unigrams)
+        self.bigrams = dict(bigrams) if bigrams else None
+
+        # Byte-level view: share of each BYTE_ALPHABET symbol, summing to 1
+        index = {char: i for i, char in enumerate(BYTE_ALPHABET)}
+        byte_expected = np.zeros(len(BYTE_ALPHABET))
+        for char, weight in self.unigrams.items():
+            char = char.lower()
+            if char in index:
+                byte_expected[index[char]] += weight
+        if ' ' not in self.unigrams:
+            byte_expected[index[' ']] = DEFAULT_SPACE
+        self.byte_expected = byte_expected / byte_expected.sum()
+
+        # Bigram shares over BYTE_ALPHABET pairs, if the profile has them
+        self.byte_bigrams = None
+        if self.bigrams:
+            matrix = np.zeros((len(BYTE_ALPHABET), len(BYTE_ALPHABET)))
+            for pair, weight in self.bigrams.items():
+                first, second = pair.lower()
+                if first in index and second in index:
+                    matrix[index[first], index[second]] += weight
+            if matrix.sum() > 0:
+                self.byte_bigrams = matrix / matrix.sum()
+
+    def char_weights(self, uppercase_share):
+        """Weight of every letter code point for text-level scoring, keyed by code point."""
+        weights = collections.Counter()
+        for char, weight in self.unigrams.items():
+            if not char.isalpha():
+                continue  # only some tables list the space, so it would skew comparisons
+            lower, upper = char.lower(), char.upper()
+            weights[ord(lower)] += weight
+            if upper != lower and len(upper) == 1:  # 'ß'.upper() is 'SS'
+                weights[ord(upper)] += weight * uppercase_share
+        return weights
+
+    def to_dict(self):
+        return {'name': self.name, 'unigrams': self.unigrams, 'bigrams': self.bigrams}
+
+
+_registry = {}
+_batch_cache = {}
+
+
+def register_profile(profile):
+    """Add or replace a profile in the registry."""
+    _registry[profile.name] = profile
+    _batch_cache.clear()
+    return profile
+
+
+def get_profile(name):
+    """Return the compiled profile registered under name."""
+    try:
+        return _registry[name]
+    except KeyError:
+        raise KeyError(f"unknown language profile {name!r}; known: {', '.join(available_profiles())}") from None
+
+
+def available_profiles():
+    """Names of all registered profiles, in registration order."""
+    return list(_registry)
+
+
+def byte_expected_matrix(names=None):
+    """Stack the byte-level shares of several profiles into a (language, symbol) array."""
+    names = tuple(names or _registry)
+    key = ('bytes', names)
+    if key not in _batch_cache:
+        _batch_cache[key] = (names, np.stack([get_profile(name).byte_expected for name in names]))
+    return _batch_cache[key]
+
+
+def char_weight_matrix(names=None, uppercase_share=0.05):
+    """Code points used by several profiles and their (language, code point) weights."""
+    names = tuple(names or _registry)
+    key = ('chars', names, uppercase_share)
+    if key not in _batch_cache:
+        per_language = [get_profile(name).char_weights(uppercase_share) for name in names]
+        codes = np.array(sorted(set().union(*per_language)))
+        weights = np.array([[weights.get(code, 0.0) for code in codes] for weights in per_language])
+        _batch_cache[key] = (names, codes, weights)
+    return _batch_cache[key]
+
+
+def byte_scores(name='english'):
+    """Log-likelihood ratio of every byte value as plaintext of a language versus a uniform random byte."""
+    key = ('scores', name)
+    if key not in _batch_cache:
+        expected = dict(zip(BYTE_ALPHABET, get_profile(name).byte_expected))
+        punctuation = [value for value in range(33, 127) if not chr(value).isalpha()]
+        probs = np.full(256, NOISE_PROBABILITY)
+        text_share = 1 - CAPITAL_SHARE - PUNCTUATION_SHARE - NEWLINE_SHARE
+        for char, share in expected.items():
+            probs[ord(char)] = share * text_share
+            if char.isalpha():
+                probs[ord(char.upper())] = expected[char] * CAPITAL_SHARE
+        probs[punctuation] = PUNCTUATION_SHARE / len(punctuation)
+        probs[ord('\n')] = NEWLINE_SHARE
+        _batch_cache[key] = np.log(probs / probs.sum() * 256).astype(np.float32)
+    return _batch_cache[key]
+
+
+def build_profile(corpus_path, name=None, bigrams=True):
+    """Count letter (and optionally bigram) frequencies of a UTF-8 corpus file."""
+    unigram_counts = collections.Counter()
+    bigram_counts = collections.Counter()
+    previous = ''
+    with open(corpus_path, encoding='utf-8', errors='replace') as corpus:
+        for line in corpus:
+            words = line.lower().split()
+            if not words:
+                continue
+            text = ' '.join(words) + ' '  # a line break reads as a space
+            unigram_counts.update(char for char in text if char.isalpha() or char == ' ')
+            if bigrams:
+                text = previous + text
+                bigram_counts.update(text[i:i + 2] for i in range(len(text) - 1)
+                                     if all(char.isalpha() or char == ' ' for char in text[i:i + 2]))
+            previous = text[-1]
+    total = sum(unigram_counts.values())
+    if total == 0:
+        raise ValueError(f"{corpus_path} contains no letters")
+    unigrams = {char: 100 * count / total for char, count in unigram_counts.items()}
+    pairs = sum(bigram_counts.values())
+    bigram_table = {pair: 100 * count / pairs for pair, count in bigram_counts.items()} if pairs else None
+    name = name or os.path.splitext(os.path.basename(corpus_path))[0]
+    return Profile(name, unigrams, bigram_table)
+
+
+def save_profile(profile, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile.to_dict(), f, ensure_ascii=False, indent=1)
+
+
+def load_profile(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return Profile(data['name'], data['unigrams'], data.get('bigrams'))
+
+
+def load_profiles(directory):
+    """Register every *.json profile found in directory."""
+    loaded = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.json'):
+            loaded.append(register_profile(load_profile(os.path.join(directory, filename))).name)
+    return loaded
+
+
+for _name, _unigrams in BUILTIN_UNIGRAMS.items():
+    register_profile(Profile(_name, _unigrams))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a language profile from a text corpus.")
+    parser.add_argument('corpus')
+    parser.add_argument('output', help="where to write the profile JSON")
+    parser.add_argument('--name', help="profile name (default: corpus file name)")
+    parser.add_argument('--no-bigrams', action='store_true')
+    args = parser.parse_args(argv)
+
+    profile = build_profile(args.corpus, args.name, bigrams=not args.no_bigrams)
+    save_profile(profile, args.output)
+    print(f"Profile {profile.name!r}: {len(profile.unigrams)} letters, "
+          f"{len(profile.bigrams or {})} bigrams -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from cryptoanalysis import (chi_squared_scores, estimate_key_length, histogram_buffer, ic_from_histograms,
+                            residue_histograms)
+
+BIG_FILE_SIZE = 16 << 20  # files above this get their key length scan split across workers
+
+
+def collect_files(patterns):
+    """Expand files, directories and glob patterns into a sorted list of files."""
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        files.extend(path for path in matches if os.path.isfile(path))
+    return sorted(set(files))
+
+
+def load_ciphertext(path):
+    """Map the file read-only so workers share pages instead of copying the file."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r')
+
+
+def recover_key_scored(data, key_length):
+    """Recover the key and report the mean chi-squared of the chosen key bytes."""
+    key = bytearray()
+    total = 0.0
+    for hist in residue_histograms(data, key_length):
+        scores = chi_squared_scores(hist)
+        key_byte = int(np.argmin(scores))
+        key.append(key_byte)
+        total += float(scores[key_byte])
+    return bytes(key), total / key_length
+
+
+def analyze_file(path, max_key_length):
+    """Run the whole attack on one file inside a worker."""
+    data = load_ciphertext(path)
+    if len(data) == 0:
+        raise ValueError("empty file")
+    max_key_length = min(max_key_length, len(data))
+    ics = estimate_key_length(data, max_key_length)
+    key_length, ic = max(ics, key=lambda x: x[1])
+    key, score = recover_key_scored(data, key_length)
+    return {'key_length': key_length, 'ic': ic, 'key': key.hex(), 'score': score, 'bytes': len(data)}
+
+
+def scan_key_lengths(path, key_lengths):
+    """Average IC for a slice of the candidate key lengths of a big file.
+
+    The mapped file is histogrammed chunk by chunk, so each worker holds a
+    scratch buffer of about HISTOGRAM_CHUNK codes whatever the file size.
+    """
+    data = load_ciphertext(path)
+    buffer = histogram_buffer(len(data), max(key_lengths))
+    return [(key_length, float(ic_from_histograms(residue_histograms(data, key_length, buffer)).mean()))
+            for key_length in key_lengths]
+
+
+def recover_file_key(path, key_length):
+    """Recover the key of a big file once its key length is known."""
+    data = load_ciphertext(path)
+    key, score = recover_key_scored(data, key_length)
+    return {'key_length': key_length, 'key': key.hex(), 'score': score, 'bytes': len(data)}
+
+
+class BatchRun:
+    """Schedules per-file work on a process pool and emits records as files finish."""
+
+    def __init__(self, executor, max_key_length, workers, big_file_size, output):
+        self.executor = executor
+        self.max_key_length = max_key_length
+        self.workers = workers
+        self.big_file_size = big_file_size
+        self.output = output
+        self.pending = {}  # future -> (path, stage)
+        self.started = {}
+        self.scans = {}  # path -> [remaining chunk count, collected ics]
+        self.best_ic = {}
+
+    def submit(self, path):
+        self.started[path] = time.perf_counter()
+        size = os.path.getsize(path)
+        if size < self.big_file_size:
+            future = self.executor.submit(analyze_file, path, self.max_key_length)
+            self.pending[future] = (path, 'file')
+            return
+        # Split the key length candidates into one slice per worker
+        lengths = range(1, min(self.max_key_length, size) + 1)
+        chunks = [lengths[i::self.workers] for i in range(self.workers) if lengths[i::self.workers]]
+        self.scans[path] = [len(chunks), []]
+        for chunk in chunks:
+            future = self.executor.submit(scan_key_lengths, path, list(chunk))
+            self.pending[future] = (path, 'scan')
+
+    def emit(self, path, record):
+        record = {'file': path, **record, 'seconds': round(time.perf_counter() - self.started.pop(path), 6)}
+        self.output.write(json.dumps(record) + '\n')
+        self.output.flush()
+
+    def handle(self, future):
+        if future not in self.pending:
+            return  # a sibling scan of its file failed and the file was already reported
+        path, stage = self.pending.pop(future)
+        try:
+            result = future.result()
+        except Exception as error:
+            # Drop the file's other scan chunks so their results are never looked up
+            for other, (other_path, _) in list(self.pending.items()):
+                if other_path == path:
+                    other.cancel()
+                    del self.pending[other]
+            self.scans.pop(path, None)
+            self.best_ic.pop(path, None)
+            self.emit(path, {'error': f"{type(error).__name__}: {error}"})
+            return
+        if stage == 'scan':
+            scan = self.scans[path]
+            scan[0] -= 1
+            scan[1].extend(result)
+            if scan[0]:
+                return
+            key_length, self.best_ic[path] = max(sorted(self.scans.pop(path)[1]), key=lambda x: x[1])
+            future = self.executor.submit(recover_file_key, path, key_length)
+            self.pending[future] = (path, 'key')
+        elif stage == 'key':
+            self.emit(path, {'key_length': result['key_length'], 'ic': self.best_ic.pop(path),
+                             'key': result['key'], 'score': result['score'], 'bytes': result['bytes']})
+        else:
+            self.emit(path, result)
+
+    def run(self, files):
+        for path in files:
+            self.submit(path)
+        while self.pending:
+            done, _ = concurrent.futures.wait(self.pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                self.handle(future)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recover repeating XOR keys for many ciphertext files.")
+    parser.add_argument('paths', nargs='+', help="files, directories or glob patterns")
+    parser.add_argument('--max-key-length', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--big-file-size', type=int, default=BIG_FILE_SIZE,
+                        help="files of at least this many bytes have their key length scan split across workers")
+    parser.add_argument('-o', '--output', help="JSONL output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    files = collect_files(args.paths)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+            BatchRun(executor, args.max_key_length, args.workers, args.big_file_size, output).run(files)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+
+from cryptoanalysis import as_byte_array
+from streaming import DEFAULT_CHUNK_SIZE, StreamingAnalyzer
+
+DEFAULT_MAX_BYTES = 256 << 20
+ENTRY_PREFIX = 'analysis-'  # only files named like entries are ever read or evicted
+ENTRY_SUFFIX = '.npz'
+
+
+def _entry_name(size, max_key_length, digest):
+    return f"{ENTRY_PREFIX}{size}-{max_key_length}-{digest}{ENTRY_SUFFIX}"
+
+
+def _entries(directory):
+    """(path, size, max_key_length, digest) of every cache entry in directory."""
+    entries = []
+    for path in glob.glob(os.path.join(directory, f"{ENTRY_PREFIX}*{ENTRY_SUFFIX}")):
+        fields = os.path.basename(path)[len(ENTRY_PREFIX):-len(ENTRY_SUFFIX)].split('-')
+        if len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit():
+            entries.append((path, int(fields[0]), int(fields[1]), fields[2]))
+    return entries
+
+
+class CacheEntry:
+    """Per-residue histograms of one ciphertext plus whatever was derived from them."""
+
+    def __init__(self, digest, analyzer, ics=None, keys=None, status='miss'):
+        self.digest = digest
+        self.analyzer = analyzer
+        self.ics = ics  # average IC per key length 1..max_key_length
+        self.keys = keys or {}  # 'key_length:language' -> key hex
+        self.status = status  # 'hit', 'extended' (cached prefix + new tail) or 'miss'
+
+    @property
+    def name(self):
+        return _entry_name(self.analyzer.position, self.analyzer.max_key_length, self.digest)
+
+
+class AnalysisCache:
+    """Content-addressed store of analysis results, bounded in size with LRU eviction.
+
+    Entries are named after the SHA-256 of the ciphertext and the largest key
+    length their histograms cover, so an entry also answers any smaller
+    max_key_length. A file that grew by appending finds the entry of its old
+    contents by hashing its prefix and only feeds the new tail through the
+    histograms. Every hit touches the entry's mtime; when the directory
+    exceeds max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _candidates(self, size, max_key_length):
+        """Entries that are no longer than size and cover max_key_length, longest first."""
+        candidates = []
+        for path, entry_size, entry_max_key_length, digest in _entries(self.directory):
+            if entry_size <= size and entry_max_key_length >= max_key_length:
+                candidates.append((entry_size, entry_max_key_length, digest, path))
+        return sorted(candidates, reverse=True)
+
+    def _load(self, path, digest, status):
+        with np.load(path) as state:
+            analyzer = StreamingAnalyzer(int(state['max_key_length']), int(state['position']),
+                                         state['counts'].astype(np.int64))
+            ics = state['ics'].copy() if status == 'hit' else None
+            keys = json.loads(str(state['keys'])) if status == 'hit' else None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        return CacheEntry(digest, analyzer, ics, keys, status)
+
+    def lookup(self, encrypted_text, max_key_length):
+        """Entry for a ciphertext, reusing the longest cached prefix that matches.
+
+        The entry is stored again only by store(), so a miss costs nothing on disk.
+        """
+        data = as_byte_array(encrypted_text)
+        candidates = self._candidates(len(data), max_key_length)
+        # One pass over the data yields the digest of every candidate prefix and of the whole file,
+        # so checking every shorter entry costs no more than hashing the file once
+        hasher = hashlib.sha256()
+        hashed = 0
+        prefix_digests = {}
+        for size in sorted({candidate[0] for candidate in candidates}):
+            hasher.update(data[hashed:size])
+            hashed = size
+            prefix_digests[size] = hasher.copy().hexdigest()
+        hasher.update(data[hashed:])
+        digest = hasher.hexdigest()
+
+        for size, _, entry_digest, path in candidates:
+            if prefix_digests[size] != entry_digest:
+                continue
+            try:
+                entry = self._load(path, digest, 'hit' if size == len(data) else 'extended')
+            except (FileNotFoundError, OSError, ValueError, KeyError):
+                continue  # evicted or half-written by another process
+            break
+        else:
+            entry = CacheEntry(digest, StreamingAnalyzer(max_key_length))
+        for start in range(entry.analyzer.position, len(data), DEFAULT_CHUNK_SIZE):
+            entry.analyzer.update(data[start:start + DEFAULT_CHUNK_SIZE])
+        return entry
+
+    def store(self, entry):
+        """Write an entry atomically, then evict old entries beyond max_bytes.
+
+        Counts are stored compressed in the narrowest unsigned type that holds
+        them; no count can exceed the number of bytes seen. An entry that alone
+        would exceed max_bytes is not kept, with a warning.
+        """
+        analyzer = entry.analyzer
+        if entry.ics is None:
+            entry.ics = np.array([ic for _, ic in analyzer.key_length_scores()])
+        path = os.path.join(self.directory, entry.name)
+        temporary = path + '.tmp'
+        counts = analyzer.counts.astype(np.min_scalar_type(analyzer.position))
+        with open(temporary, 'wb') as f:
+            np.savez_compressed(f, max_key_length=analyzer.max_key_length, position=analyzer.position,
+                                counts=counts, ics=entry.ics, keys=json.dumps(entry.keys))
+        size = os.path.getsize(temporary)
+        if size > self.max_bytes:
+            os.remove(temporary)
+            warnings.warn(f"not caching {entry.name}: {size} bytes exceeds the cache limit of "
+                          f"{self.max_bytes} bytes", RuntimeWarning, stacklevel=2)
+            return
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path, _, _, _ in _entries(self.directory):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def estimate_key_length(self, encrypted_text, max_key_length):
+        """Cached equivalent of cryptoanalysis.estimate_key_length."""
+        entry = self.lookup(encrypted_text, max_key_length)
+        if entry.status != 'hit':
+            self.store(entry)
+        return [(key_length, float(ic)) for key_length, ic in enumerate(entry.ics[:max_key_length], 1)]
+
+    def recover_key(self, encrypted_text, key_length, language='english', max_key_length=None):
+        """Cached equivalent of cryptoanalysis.recover_key for an explicit language."""
+        entry = self.lookup(encrypted_text, max(key_length, max_key_length or 0))
+        name = f"{key_length}:{language}"
+        if name not in entry.keys:
+            entry.keys[name] = entry.analyzer.current_key(key_length, language).hex()
+            self.store(entry)
+        return bytes.fromhex(entry.keys[name])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or trim the analysis cache.")
+    parser.add_argument('directory')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument('--evict', action='store_true', help="trim the cache to --max-bytes")
+    args = parser.parse_args(argv)
+
+    cache = AnalysisCache(args.directory, args.max_bytes)
+    if args.evict:
+        cache.evict()
+    entries = sorted(_entries(args.directory), key=lambda entry: os.path.getmtime(entry[0]), reverse=True)
+    paths = [entry[0] for entry in entries]
+    for path, size, max_key_length, digest in entries:
+        print(f"{digest[:16]}  {size:>12} bytes  key lengths <= {max_key_length:<4} "
+              f"{os.path.getsize(path) / 1e6:8.2f} MB on disk")
+    print(f"{len(paths)} entries, {sum(map(os.path.getsize, paths)) / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,19 @@
+import argparse
 import collections
+import cProfile
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'languages'))
+from profiles import BYTE_ALPHABET, byte_expected_matrix, get_profile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'otp'))
+from keystream import apply_key
+
+import profiling
+from profiling import profiled, stage
 
 def read_encrypted_file(filename):
     with open(filename, 'rb') as f:
@@ -16,20 +31,170 @@ def calculate_ic(text):
     else:
         return ic / (N * (N - 1))
 
+def as_byte_array(data):
+    """View bytes-like data as a flat uint8 array without copying."""
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, dtype=np.uint8)
+
+HISTOGRAM_CHUNK = 1 << 20  # ciphertext bytes coded per bincount; bounds the scratch memory
+
+def histogram_buffer(size, max_key_length):
+    """Scratch buffer for residue_histograms over size bytes and key lengths up to max_key_length."""
+    return np.empty(min(size, HISTOGRAM_CHUNK + max_key_length), dtype=np.int32)
+
+@profiled()
+def residue_histograms(encrypted_text, key_length, buffer=None):
+    """Count every byte value at every residue position modulo key_length.
+
+    Returns an array of shape (key_length, 256) where row i is the histogram of
+    encrypted_text[i::key_length]. The ciphertext is coded in chunks of about
+    HISTOGRAM_CHUNK bytes, each a whole number of key periods, so every residue
+    gets its own block of 256 bins and one bincount per chunk covers them all.
+    A buffer from histogram_buffer can be passed in to avoid reallocating the
+    int32 codes when scanning many key lengths.
+    """
+    data = as_byte_array(encrypted_text)
+    chunk = max(key_length, HISTOGRAM_CHUNK - HISTOGRAM_CHUNK % key_length)
+    if buffer is None or len(buffer) < min(chunk, len(data)):
+        buffer = np.empty(min(chunk, len(data)), dtype=np.int32)
+    offsets = np.arange(key_length, dtype=np.int32) * 256
+    hist = np.zeros(key_length * 256, dtype=np.int64)
+    for start in range(0, len(data), chunk):
+        part = data[start:start + chunk]
+        rows = len(part) // key_length
+        codes = buffer[:rows * key_length]
+        np.add(part[:rows * key_length].reshape(rows, key_length), offsets, out=codes.reshape(rows, key_length))
+        hist += np.bincount(codes, minlength=key_length * 256)
+        # Only the last chunk can end inside a period; its leftover bytes start at residue 0
+        tail = part[rows * key_length:]
+        hist[offsets[:len(tail)] + tail] += 1
+    return hist.reshape(key_length, 256)
+
+def ic_from_histograms(hist):
+    """Index of Coincidence of every row of a (residues, 256) histogram array."""
+    hist = hist.astype(np.float64)
+    n = hist.sum(axis=1)
+    pairs = n * (n - 1)
+    coincidences = (hist * (hist - 1)).sum(axis=1)
+    return np.divide(coincidences, pairs, out=np.zeros_like(n), where=pairs > 0)
+
 def estimate_key_length(encrypted_text, max_key_length):
     """Estimate the key length using the Index of Coincidence."""
+    data = as_byte_array(encrypted_text)
+    buffer = histogram_buffer(len(data), max_key_length)
     ics = []
     for key_length in range(1, max_key_length + 1):
-        ic_total = 0.0
-        for i in range(key_length):
-            # Extract every key_length-th byte starting from position i
-            subtext = encrypted_text[i::key_length]
-            ic = calculate_ic(subtext)
-            ic_total += ic
-        average_ic = ic_total / key_length
-        ics.append((key_length, average_ic))
+        average_ic = ic_from_histograms(residue_histograms(data, key_length, buffer)).mean()
+        ics.append((key_length, float(average_ic)))
     return ics
 
+def coincidence_rates(encrypted_text, max_shift, projections=8, seed=0):
+    """Estimate how often byte i equals byte i+s for every shift s up to max_shift.
+
+    Every byte value is mapped to a random +1/-1 sign per projection; the
+    product of two signs averages to 1 for equal bytes and 0 otherwise, so the
+    FFT autocorrelation of the sign sequence counts coincidences for all
+    shifts at once.
+    """
+    data = as_byte_array(encrypted_text)
+    n = len(data)
+    max_shift = min(max_shift, n - 1)
+    if max_shift < 1:
+        return np.zeros(max_shift + 1 if max_shift >= 0 else 0)
+    signs = np.random.default_rng(seed).choice([-1.0, 1.0], size=(projections, 256))
+    size = 1 << (n + max_shift).bit_length()  # zero padding avoids circular wrap-around
+    total = np.zeros(max_shift + 1)
+    for projection in signs:
+        spectrum = np.fft.rfft(projection[data], size)
+        total += np.fft.irfft(spectrum * spectrum.conj(), size)[:max_shift + 1]
+    overlaps = n - np.arange(max_shift + 1)
+    rates = total / projections / overlaps
+    return np.clip(rates, 0.0, 1.0)
+
+def estimate_key_length_autocorrelation(encrypted_text, max_key_length, max_multiple=8):
+    """Estimate the key length with a Kasiski-style autocorrelation scan.
+
+    A key length scores the mean coincidence rate over its first max_multiple
+    multiples, since shifts by a multiple of the period line up equal key bytes.
+    """
+    rates = coincidence_rates(encrypted_text, max_key_length * max_multiple)
+    scores = []
+    for key_length in range(1, max_key_length + 1):
+        shifts = rates[key_length::key_length]
+        scores.append((key_length, float(shifts.mean()) if len(shifts) else 0.0))
+    return scores
+
+SampledEstimate = collections.namedtuple('SampledEstimate', 'key_length confidence scores sampled_bytes')
+RANDOM_COINCIDENCE = 1 / 256  # match rate of bytes under unrelated key bytes
+ACCEPT_SHARE = 0.75  # share of the best score above random a length must reach
+
+def _paired_z(differences):
+    """z statistic of the mean of per-window differences, column by column."""
+    count = len(differences)
+    mean = differences.mean(axis=0)
+    spread = differences.std(axis=0, ddof=1) if count > 1 else np.zeros_like(mean)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = mean / spread * math.sqrt(count)
+    # Identical columns differ by exactly zero; a constant nonzero gap is certain
+    return np.where(spread > 0, z, np.where(mean > 0, np.inf, np.where(mean < 0, -np.inf, 0.0)))
+
+def estimate_key_length_sampled(encrypted_text, max_key_length, window=512, batch=32, min_windows=32,
+                                z_stop=4.0, seed=0):
+    """Estimate the key length from random windows of the ciphertext, stopping early.
+
+    The ciphertext is cut into aligned windows and windows are drawn at random,
+    batch by batch. In each window the coincidence rate of every shift up to
+    twice max_key_length is counted; a key length scores the mean rate over its
+    multiples. Shifts that are not a multiple of the period match at the rate
+    of random bytes, 1/256. Multiples of the period score as high as the period
+    itself, so the estimate is the shortest length whose score reaches
+    ACCEPT_SHARE of the best score above that baseline; shorter divisors of the
+    period fall well below it. Sampling stops once paired z-tests over the
+    windows put the best score z_stop standard errors above the baseline, the
+    chosen length above the acceptance level and every shorter length below it.
+
+    Returns a SampledEstimate with the confidence (one-sided normal probability
+    of the weakest of those tests), the (key_length, rate) scores and the
+    number of bytes examined.
+    """
+    data = as_byte_array(encrypted_text)
+    max_shift = min(2 * max_key_length, len(data) - 2)
+    if max_shift < 1:
+        return SampledEstimate(1, 0.0, [(1, 0.0)], len(data))
+    max_key_length = min(max_key_length, max_shift)
+    window = max(1, min(window, (len(data) - max_shift) // min_windows))
+    slots = (len(data) - max_shift) // window
+    order = np.random.default_rng(seed).permutation(slots)
+    shifts = np.arange(1, max_shift + 1)
+    lengths = np.arange(1, max_key_length + 1)
+    # weights[s - 1, L - 1] averages the rates of the multiples of L
+    multiples = shifts[:, None] % lengths[None, :] == 0
+    weights = multiples / multiples.sum(axis=0)
+    offsets = np.arange(window + max_shift)
+    batches = []
+    for start in range(0, slots, batch):
+        blocks = data[order[start:start + batch, None] * window + offsets]
+        counts = np.empty((len(blocks), max_shift))
+        for shift in shifts:
+            counts[:, shift - 1] = (blocks[:, :window] == blocks[:, shift:shift + window]).sum(axis=1)
+        batches.append(counts)
+        rates = np.concatenate(batches) @ weights / window  # (window, key length)
+        best = int(np.argmax(rates.mean(axis=0)))
+        signal_z = float(_paired_z(rates[:, [best]] - RANDOM_COINCIDENCE)[0])
+        # Positive where a length reaches the acceptance level, negative where it falls short
+        acceptance_z = _paired_z(rates - RANDOM_COINCIDENCE
+                                 - ACCEPT_SHARE * (rates[:, [best]] - RANDOM_COINCIDENCE))
+        key_length = int(np.argmax(acceptance_z > -z_stop)) + 1  # shortest length not ruled out
+        confidence_z = min([signal_z, float(acceptance_z[key_length - 1])]
+                           + (-acceptance_z[:key_length - 1]).tolist())
+        if len(rates) >= min_windows and confidence_z >= z_stop:
+            break
+    confidence = 1 - 0.5 * math.erfc(confidence_z / math.sqrt(2))
+    scores = [(int(length), float(rate)) for length, rate in zip(lengths, rates.mean(axis=0))]
+    sampled_bytes = min(len(rates) * (window + max_shift), len(data))
+    return SampledEstimate(key_length, confidence, scores, sampled_bytes)
+
 def chi_squared_statistic(observed_freq, expected_freq, total_count):
     """Calculates the chi-squared statistic."""
     chi_squared = 0.0
@@ -41,82 +206,183 @@ def chi_squared_statistic(observed_freq, expected_freq, total_count):
 
 def get_english_letter_frequency():
     """Returns a dictionary with English letter frequencies."""
-    frequency = {
-        'a': 8.167, 'b': 1.492, 'c': 2.782, 'd': 4.253,
-        'e': 12.702,'f': 2.228, 'g': 2.015, 'h': 6.094,
-        'i': 6.966, 'j': 0.153, 'k': 0.772, 'l': 4.025,
-        'm': 2.406, 'n': 6.749, 'o': 7.507, 'p': 1.929,
-        'q': 0.095, 'r': 5.987, 's': 6.327, 't': 9.056,
-        'u': 2.758, 'v': 0.978, 'w': 2.360, 'x': 0.150,
-        'y': 1.974, 'z': 0.074, ' ': 13.000 
-    }
-    return frequency
-
-def frequency_analysis(block):
-    """Performs frequency analysis on a block to find the most probable key byte."""
-    english_freq = get_english_letter_frequency()
-    min_chi_squared = None
-    likely_key_byte = None
+    return dict(get_profile('english').unigrams)
 
-    for key_candidate in range(256):
-        decrypted_block = bytes([b ^ key_candidate for b in block])
-        decrypted_text = ''.join([chr(b) if 32 <= b <= 126 else ' ' for b in decrypted_block])
-        decrypted_text = decrypted_text.lower()
-        total_chars = len(decrypted_text)
-        if total_chars == 0:
-            continue
+def fold_matrix(alphabet):
+    """Map every decrypted byte value onto the alphabet the way the scorer reads text.
 
-        # Count frequency of each character
-        observed_freq = collections.Counter(decrypted_text)
+    Bytes outside printable ASCII count as spaces and letters are lowercased, as
+    in the original per-candidate decoding. Returns a (256, len(alphabet))
+    one-hot matrix; bytes that fold to characters outside the alphabet get an
+    all-zero row and are ignored.
+    """
+    index = {char: i for i, char in enumerate(alphabet)}
+    fold = np.zeros((256, len(alphabet)))
+    for value in range(256):
+        char = chr(value).lower() if 32 <= value <= 126 else ' '
+        if char in index:
+            fold[value, index[char]] = 1.0
+    return fold
 
-        # Calculate chi-squared statistic
-        chi_squared = chi_squared_statistic(observed_freq, english_freq, total_chars)
+# CANDIDATES[method][k, v] is the ciphertext byte that decrypts to v under key byte k,
+# so hist[table] is the plaintext histogram for every key byte at once.
+XOR_CANDIDATES = np.bitwise_xor.outer(np.arange(256), np.arange(256))
+ADD_CANDIDATES = np.add.outer(np.arange(256), np.arange(256)) % 256
+CANDIDATES = {'XOR': XOR_CANDIDATES, 'ADD': ADD_CANDIDATES}
+BYTE_FOLD = fold_matrix(BYTE_ALPHABET)
 
-        if min_chi_squared is None or chi_squared < min_chi_squared:
-            min_chi_squared = chi_squared
-            likely_key_byte = key_candidate
+def candidate_table(method):
+    """Candidate mapping table of a byte-wise key operation ('XOR' or 'ADD')."""
+    if method not in CANDIDATES:
+        raise ValueError(f"unknown method {method!r}")
+    return CANDIDATES[method]
+
+def chi_squared_scores(hist, expected=None, method='XOR'):
+    """Chi-squared statistic of all 256 key bytes for one byte histogram.
+
+    expected holds the symbol shares of one language (default English) or a
+    (language, symbol) matrix, in which case one row of scores per language
+    is returned.
+    """
+    if expected is None:
+        expected = get_profile('english').byte_expected
+    observed = hist[candidate_table(method)] @ BYTE_FOLD  # (key byte, symbol) counts
+    expected = expected[..., None, :] * hist.sum()
+    return (((observed - expected) ** 2) / expected).sum(axis=-1)
+
+def frequency_analysis(block, language='english', method='XOR'):
+    """Performs frequency analysis on a block to find the most probable key byte."""
+    if len(block) == 0:
+        return None
+    with stage('frequency_analysis', bytes=len(block), candidates=256):
+        hist = np.bincount(as_byte_array(block), minlength=256)
+        return int(np.argmin(chi_squared_scores(hist, get_profile(language).byte_expected, method)))
 
-    return likely_key_byte
+@profiled()
+def detect_language(encrypted_text, key_length, languages=None, method='XOR'):
+    """Rank languages by the total chi-squared of their best key, best first.
 
-def recover_key(encrypted_text, key_length):
-    """Recovers the key used to encrypt the text."""
+    All languages are scored together: each column histogram is compared with
+    every profile in a single batched chi-squared computation.
+    """
+    names, expected = byte_expected_matrix(languages)
+    totals = np.zeros(len(names))
+    for hist in residue_histograms(encrypted_text, key_length):
+        totals += chi_squared_scores(hist, expected, method).min(axis=1)
+    return sorted(zip(names, totals.tolist()), key=lambda x: x[1])
+
+def recover_key(encrypted_text, key_length, language='english', method='XOR'):
+    """Recovers the key used to encrypt the text with method ('XOR' or 'ADD').
+
+    Pass language=None to pick the best matching registered language first.
+    """
+    if language is None:
+        language = detect_language(encrypted_text, key_length, method=method)[0][0]
+    expected = get_profile(language).byte_expected
+    hists = residue_histograms(encrypted_text, key_length)  # every column from the same scan
     key = bytearray()
-    for i in range(key_length):
-        block = encrypted_text[i::key_length]
-        key_byte = frequency_analysis(block)
-        key.append(key_byte)
+    for hist in hists:
+        with stage('frequency_analysis', bytes=int(hist.sum()), candidates=256):
+            key.append(int(np.argmin(chi_squared_scores(hist, expected, method))))
     return bytes(key)
 
-def decrypt_with_key(encrypted_text, key):
+def decrypt_with_key(encrypted_text, key, method='XOR'):
     """Decrypts the encrypted text using the recovered key."""
-    extended_key = (key * (len(encrypted_text) // len(key))) + key[:len(encrypted_text) % len(key)]
-    decrypted_bytes = bytes([e ^ k for e, k in zip(encrypted_text, extended_key)])
+    decrypted_bytes = apply_key(encrypted_text, key, method, decrypt=True)
     return decrypted_bytes.decode('utf-8', errors='replace')
 
 
-def main():
-    encrypted_text = read_encrypted_file('encrypted.bin')
-    max_key_length = 60  # Adjust based on expected key length range
-    ics = estimate_key_length(encrypted_text, max_key_length)
-    print("Key Length Estimation using Index of Coincidence:")
-    for key_length, ic in ics:
-        print(f"Key Length: {key_length}, Average IC: {ic:.4f}")
+def analyze(filename, max_key_length, refine=True, cache_dir=None, sampled=False):
+    """Run the whole attack on one file and print every step."""
+    with stage('read'):
+        encrypted_text = read_encrypted_file(filename)
+    profiling.record('read', bytes=len(encrypted_text))
+    cache = None
+    if cache_dir:
+        from cache import AnalysisCache  # cache imports this module, so import it lazily
+        cache = AnalysisCache(cache_dir)
+    if sampled:
+        with stage('sampled_estimation', candidates=max_key_length):
+            estimate = estimate_key_length_sampled(encrypted_text, max_key_length)
+        profiling.record('sampled_estimation', bytes=estimate.sampled_bytes)
+        print("Key Length Estimation using sampled coincidence rates:")
+        for key_length, rate in estimate.scores:
+            print(f"Key Length: {key_length}, Coincidence Rate: {rate:.4f}")
+        likely_key_length = estimate.key_length
+        print(f"\nMost likely key length: {likely_key_length} (confidence {estimate.confidence:.4f}, "
+              f"sampled {estimate.sampled_bytes} of {len(encrypted_text)} bytes)")
+    else:
+        with stage('ic_estimation', bytes=len(encrypted_text) * max_key_length, candidates=max_key_length):
+            if cache is not None:
+                ics = cache.estimate_key_length(encrypted_text, max_key_length)
+            else:
+                ics = estimate_key_length(encrypted_text, max_key_length)
+        print("Key Length Estimation using Index of Coincidence:")
+        for key_length, ic in ics:
+            print(f"Key Length: {key_length}, Average IC: {ic:.4f}")
 
-    # Identify the key length with the highest average IC
-    likely_key_length = max(ics, key=lambda x: x[1])[0]
-    print(f"\nMost likely key length: {likely_key_length}")
+        # Identify the key length with the highest average IC
+        likely_key_length = max(ics, key=lambda x: x[1])[0]
+        print(f"\nMost likely key length: {likely_key_length}")
 
     key_length = likely_key_length
 
     print(f"Recovering key of length {key_length}...")
-    recovered_key = recover_key(encrypted_text, key_length)
+    with stage('key_recovery', bytes=len(encrypted_text), candidates=256 * key_length):
+        if cache is not None:
+            recovered_key = cache.recover_key(encrypted_text, key_length, max_key_length=max_key_length)
+        else:
+            recovered_key = recover_key(encrypted_text, key_length)
     print(f"Recovered Key (hex): {recovered_key.hex()}")
 
-    decrypted_message = decrypt_with_key(encrypted_text, recovered_key)
+    if refine:
+        from ngram import refine_key  # ngram imports this module, so import it lazily
+        with stage('refinement'):
+            recovered_key = refine_key(encrypted_text, recovered_key)
+        print(f"Refined Key (hex):   {recovered_key.hex()}")
+
+    with stage('decryption', bytes=len(encrypted_text)):
+        decrypted_message = decrypt_with_key(encrypted_text, recovered_key)
     print("\nDecrypted Message:")
     print(decrypted_message)
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recover a repeating XOR key from a ciphertext file.")
+    parser.add_argument('filename', nargs='?', default='encrypted.bin')
+    parser.add_argument('--max-key-length', type=int, default=60,
+                        help="Adjust based on expected key length range")
+    parser.add_argument('--no-refine', action='store_true',
+                        help="skip the quadgram hill-climb after frequency analysis")
+    parser.add_argument('--sampled', action='store_true',
+                        help="estimate the key length from random samples, stopping once confident")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="reuse histograms, IC tables and keys cached in DIR")
+    parser.add_argument('--profile', action='store_true', help="report per-stage metrics as JSON")
+    parser.add_argument('--profile-output', default='-', metavar='PATH',
+                        help="file for the --profile report (default: - for stderr)")
+    parser.add_argument('--cprofile', metavar='PATH', help="dump cProfile statistics to PATH")
+    args = parser.parse_args(argv)
+
+    profiler = profiling.enable() if args.profile else None
+    function_profile = cProfile.Profile() if args.cprofile else None
+    if function_profile is not None:
+        function_profile.enable()
+    try:
+        analyze(args.filename, args.max_key_length, refine=not args.no_refine, cache_dir=args.cache,
+                sampled=args.sampled)
+    finally:
+        if function_profile is not None:
+            function_profile.disable()
+        if profiler is not None:
+            profiling.disable()
+    # Reports are only written for a completed run, never over a path left behind by a failed one
+    if function_profile is not None:
+        function_profile.dump_stats(args.cprofile)
+    if profiler is not None:
+        profiler.write_report(args.profile_output)
+
+
 if __name__ == "__main__":
     main()
 
@@ -0,0 +1,135 @@
+import functools
+import os
+
+import numpy as np
+
+from cryptoanalysis import as_byte_array
+from profiling import stage
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'languages', 'corpus', 'english.txt')
+
+# Every byte is read as one of 32 symbols, so a quadgram fits in 20 bits and
+# the whole model is a flat array of 32**4 log-probabilities.
+SYMBOLS = 32
+SPACE, UPPER, DIGIT, PUNCTUATION, WHITESPACE, OTHER = range(26, 32)
+WEIGHTS = (0.4, 0.3, 0.2, 0.1)  # interpolation weights for 4-, 3-, 2- and 1-gram estimates
+FLOOR = 1e-6
+CANDIDATE_BATCH = 1 << 22  # symbols evaluated per batch when refining a key byte
+
+
+def _symbol_table():
+    table = np.full(256, OTHER, dtype=np.intp)
+    for value in range(256):
+        char = chr(value)
+        if 'a' <= char <= 'z':
+            table[value] = value - ord('a')
+        elif 'A' <= char <= 'Z':
+            table[value] = UPPER  # capitals mid-word are what case-bit key errors produce
+        elif char == ' ':
+            table[value] = SPACE
+        elif char.isdigit():
+            table[value] = DIGIT
+        elif char in '\t\n\r\x0b\x0c':
+            table[value] = WHITESPACE
+        elif 33 <= value <= 126:
+            table[value] = PUNCTUATION
+    return table
+
+SYMBOL_OF_BYTE = _symbol_table()
+
+
+def quadgram_indices(symbols):
+    """Flat table index of every quadgram along the last axis of a symbol array."""
+    return ((symbols[..., :-3] << 15) | (symbols[..., 1:-2] << 10)
+            | (symbols[..., 2:-1] << 5) | symbols[..., 3:])
+
+
+class QuadgramScorer:
+    """Log-probability of text under an interpolated quadgram model over 32 symbols."""
+
+    def __init__(self, log_probs):
+        self.log_probs = log_probs
+
+    @classmethod
+    def from_bytes(cls, text):
+        symbols = SYMBOL_OF_BYTE[as_byte_array(text)]
+        counts = np.bincount(quadgram_indices(symbols), minlength=SYMBOLS ** 4)
+        counts = counts.reshape((SYMBOLS,) * 4).astype(np.float64)
+
+        def conditional(table):
+            # P(last symbol | preceding ones); unseen contexts contribute nothing
+            context = table.sum(axis=-1, keepdims=True)
+            return np.divide(table, context, out=np.zeros_like(table), where=context > 0)
+
+        probs = (WEIGHTS[0] * conditional(counts)
+                 + WEIGHTS[1] * conditional(counts.sum(axis=0))[None]
+                 + WEIGHTS[2] * conditional(counts.sum(axis=(0, 1)))[None, None]
+                 + WEIGHTS[3] * conditional(counts.sum(axis=(0, 1, 2)))[None, None, None])
+        return cls(np.log(probs + FLOOR).astype(np.float32).ravel())
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def score(self, plaintext):
+        """Total log-probability of a byte string."""
+        symbols = SYMBOL_OF_BYTE[as_byte_array(plaintext)]
+        return float(self.log_probs[quadgram_indices(symbols)].sum())
+
+
+@functools.lru_cache(maxsize=None)
+def default_scorer():
+    """Quadgram scorer trained on the bundled English corpus."""
+    return QuadgramScorer.from_file(DEFAULT_CORPUS)
+
+
+def refine_key(encrypted_text, key, scorer=None, max_rounds=10, sample_size=1 << 16):
+    """Hill-climb over key bytes to maximise the quadgram score of the plaintext.
+
+    Each step tries all 256 values of one key byte at once. Only the quadgrams
+    that overlap positions encrypted by that key byte are rescored, so the cost
+    of a step does not depend on the key length. Sweeps repeat until no byte
+    changes or max_rounds is reached. Only the first sample_size bytes are
+    used, which is plenty to settle every key byte.
+    """
+    scorer = scorer or default_scorer()
+    data = as_byte_array(encrypted_text)[:sample_size]
+    key = np.frombuffer(bytes(key), dtype=np.uint8).copy()
+    key_length = len(key)
+    n = len(data)
+    if n < 4 or key_length == 0:
+        return bytes(key)
+    positions = np.arange(n)
+    symbols = SYMBOL_OF_BYTE[data ^ key[positions % key_length]]
+
+    windows = []
+    for column in range(key_length):
+        # Quadgram starts whose four positions include at least one byte of this column
+        starts = np.unique(np.concatenate([np.arange(column, n, key_length) - offset for offset in range(4)]))
+        starts = starts[(starts >= 0) & (starts <= n - 4)]
+        window = starts[:, None] + np.arange(4)
+        windows.append((window, window % key_length == column))
+
+    for _ in range(max_rounds):
+        changed = False
+        with stage('refine_sweep', bytes=n, candidates=256 * key_length):
+            for column, (window, in_column) in enumerate(windows):
+                cipher_bytes = data[window]
+                base = symbols[window]
+                scores = np.empty(256)
+                group = max(1, min(256, CANDIDATE_BATCH // window.size))
+                for first in range(0, 256, group):
+                    # Symbols of every window under a batch of candidate key bytes
+                    values = np.arange(first, min(first + group, 256))[:, None, None]
+                    candidates = np.where(in_column, SYMBOL_OF_BYTE[cipher_bytes ^ values], base)
+                    scores[first:first + group] = scorer.log_probs[quadgram_indices(candidates)[..., 0]].sum(axis=1)
+                best = int(np.argmax(scores))
+                if best != key[column] and scores[best] > scores[key[column]]:
+                    key[column] = best
+                    column_positions = positions[column::key_length]
+                    symbols[column_positions] = SYMBOL_OF_BYTE[data[column_positions] ^ best]
+                    changed = True
+        if not changed:
+            break
+    return bytes(key)
@@ -1,4 +1,8 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'otp'))
+from keystream import apply_key
 
 def generate_key(message_length):
     """Generate a random key of the same length as the message."""
@@ -11,22 +15,15 @@ def extend_key(key, message_length):
 def encrypt(message, key, method='XOR'):
     """Encrypt the message using the key."""
     message_bytes = message.encode('utf-8')
-    if method == 'XOR':
-        encrypted_bytes = bytes([m ^ k for m, k in zip(message_bytes, key)]) # XOR operation
-    elif method == 'ADD':
-        encrypted_bytes = bytes([(m + k) % 256 for m, k in zip(message_bytes, key)])  # Addition with overflow handling
-    else:
+    if method not in ('XOR', 'ADD'):
         return -1
-    return encrypted_bytes
+    return apply_key(message_bytes, key, method)  # Key is repeated chunk by chunk, never extended
 
 def decrypt(encrypted_message, key, method='XOR'):
     """Decrypt the encrypted message using the key."""
-    if method == 'XOR':
-        decrypted_bytes = bytes([e ^ k for e, k in zip(encrypted_message, key)]) # XOR operation
-    elif method == 'ADD':
-        decrypted_bytes = bytes([(e - k) % 256 for e, k in zip(encrypted_message, key)])  # Subtraction to reverse encryption
-    else:
+    if method not in ('XOR', 'ADD'):
         return -1
+    decrypted_bytes = apply_key(encrypted_message, key, method, decrypt=True)
     return decrypted_bytes.decode('utf-8')
 
 # Example Usage
@@ -42,16 +39,13 @@ Of all the places along the path, the area they were approaching, with the islan
 The terrain along this stretch of the river was mostly flat, but in the immediate vicinity of the island, the land on the sunrise side was like a rumpled cloth, with hills and ridges and valleys. Among Lara's people, there was a wooden baby's crib, suitable for strapping to a cart, that had been passed down for generations. The island was shaped like that crib, longer than it was wide and pointed at the upriver end, where the flow had eroded both banks.
 """
 
-key = generate_key(25)  # Generate a random key
-print(f"Key: {key.hex()}")  # Display the key in hex format
-
-extended_key = extend_key(key,len(message))
-
-encrypted_message = encrypt(message, extended_key)
-
-decrypted_message = decrypt(encrypted_message, extended_key)
+if __name__ == "__main__":
+    key = generate_key(25)  # Generate a random key
+    print(f"Key: {key.hex()}")  # Display the key in hex format
 
-with open('encrypted.bin', 'wb') as file:
-    file.write(encrypted_message)
+    encrypted_message = encrypt(message, key)  # The short key is repeated over the message
 
+    decrypted_message = decrypt(encrypted_message, key)
 
+    with open('encrypted.bin', 'wb') as file:
+        file.write(encrypted_message)
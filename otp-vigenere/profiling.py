@@ -0,0 +1,110 @@
+import contextlib
+import functools
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active = None  # the enabled Profiler, if any; hooks check this and nothing else
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process so far, in KiB (Linux reports KiB); None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class Profiler:
+    """Wall time, bytes and scored candidates per named pipeline stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    def _entry(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'candidates': 0,
+                                         'peak_rss_kb': 0}
+        return entry
+
+    def record(self, name, seconds=0.0, bytes=0, candidates=0, calls=0):
+        entry = self._entry(name)
+        entry['calls'] += calls
+        entry['seconds'] += seconds
+        entry['bytes'] += bytes
+        entry['candidates'] += candidates
+
+    @contextlib.contextmanager
+    def stage(self, name, bytes=0, candidates=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, bytes, candidates, calls=1)
+            self._entry(name)['peak_rss_kb'] = peak_rss_kb()
+
+    def report(self):
+        stages = {}
+        for name, entry in self.stages.items():
+            stages[name] = dict(entry)
+            if entry['bytes'] and entry['seconds'] > 0:
+                stages[name]['mb_per_second'] = entry['bytes'] / entry['seconds'] / 1e6
+        return {'wall_seconds': time.perf_counter() - self.started, 'peak_rss_kb': peak_rss_kb(),
+                'stages': stages}
+
+    def write_report(self, path):
+        """Write the JSON report to path, or to stderr for '-'."""
+        text = json.dumps(self.report(), indent=2)
+        if path == '-':
+            print(text, file=sys.stderr)
+        else:
+            with open(path, 'w') as f:
+                f.write(text + '\n')
+
+
+def enable():
+    """Start collecting metrics in a fresh Profiler and return it."""
+    global _active
+    _active = Profiler()
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def stage(name, bytes=0, candidates=0):
+    """Context manager timing one stage; a shared no-op when profiling is off."""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name, bytes, candidates)
+
+
+def record(name, bytes=0, candidates=0):
+    """Add counts to a stage, e.g. bytes that are only known once the stage ran."""
+    if _active is not None:
+        _active.record(name, bytes=bytes, candidates=candidates)
+
+
+def profiled(name=None):
+    """Decorator timing every call of a function as a stage (default: its name)."""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
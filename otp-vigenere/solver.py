@@ -0,0 +1,122 @@
+import argparse
+import collections
+import os
+import sys
+
+import numpy as np
+
+from cryptoanalysis import CANDIDATES, as_byte_array, detect_language, estimate_key_length, recover_key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'languages'))
+from profiles import byte_scores
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'otp'))
+from keystream import apply_key
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cezer'))
+from cezar import auto_crack, caesar_cipher
+
+KEY_METHODS = tuple(CANDIDATES)  # repeating byte keys: 'XOR', 'ADD'
+METHODS = KEY_METHODS + ('SHIFT',)  # 'SHIFT' is the Caesar cipher over Unicode code points
+SAMPLE_SIZE = 1 << 20  # plaintext bytes scored when comparing operations
+
+# key is bytes for the key methods and the shift (an int) for SHIFT; score is the
+# per-byte log-likelihood of the plaintext, comparable across methods (higher is better)
+Solution = collections.namedtuple('Solution', 'method key plaintext language score')
+
+
+def plaintext_score(plaintext, language='english'):
+    """Mean log-likelihood ratio per byte of a decrypted byte string, text versus random bytes.
+
+    Unlike the chi-squared of the key search, this also penalises control
+    bytes and misplaced capitals, so different operations can be compared.
+    """
+    data = as_byte_array(plaintext)[:SAMPLE_SIZE]
+    if len(data) == 0:
+        return float('-inf')
+    hist = np.bincount(data, minlength=256)
+    return float(hist @ byte_scores(language)) / len(data)
+
+
+def solve_key(encrypted_text, method='XOR', max_key_length=60, language='english', key_length=None):
+    """Break a repeating XOR or ADD key: IC key length, then table-driven frequency analysis."""
+    data = as_byte_array(encrypted_text)
+    if key_length is None:
+        ics = estimate_key_length(data, min(max_key_length, len(data)))
+        key_length = max(ics, key=lambda x: x[1])[0]
+    if language is None:
+        language = detect_language(data, key_length, method=method)[0][0]
+    key = recover_key(data, key_length, language, method)
+    plaintext = apply_key(data, key, method, decrypt=True)  # as decrypt_with_key, but scored before decoding
+    return Solution(method, key, plaintext.decode('utf-8', errors='replace'), language,
+                    plaintext_score(plaintext, language))
+
+
+def solve_shift(text, language='english'):
+    """Break a Caesar shift with cezar.auto_crack; language=None tries every profile."""
+    ranking = auto_crack(text, language, top=1)
+    if not ranking:
+        raise ValueError("nothing to analyse")
+    shift, _, _, language = ranking[0]
+    plaintext = caesar_cipher(text, shift, encrypt=False)
+    score = plaintext_score(plaintext.encode('utf-8', 'surrogatepass'), language)
+    return Solution('SHIFT', shift, plaintext, language, score)
+
+
+def solve_all(ciphertext, methods=None, max_key_length=60, language='english'):
+    """Solutions under every applicable operation, best first.
+
+    Byte strings are tried with the key methods, and with SHIFT when they
+    decode as UTF-8; a str can only be a Caesar ciphertext. The key length
+    estimate does not depend on the operation, so it is computed once.
+    """
+    if isinstance(ciphertext, str):
+        text, data = ciphertext, None
+    else:
+        data = as_byte_array(ciphertext)
+        try:
+            text = data.tobytes().decode('utf-8', 'surrogatepass')
+        except UnicodeDecodeError:
+            text = None
+    methods = methods or METHODS
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError(f"unknown method {method!r}")
+    solutions = []
+    if 'SHIFT' in methods and text:
+        # First, so a shift wins ties with the equivalent one-byte ADD key on ASCII text
+        solutions.append(solve_shift(text, language))
+    key_methods = [method for method in methods if method in KEY_METHODS]
+    if data is not None and len(data) and key_methods:
+        ics = estimate_key_length(data, min(max_key_length, len(data)))
+        key_length = max(ics, key=lambda x: x[1])[0]
+        solutions.extend(solve_key(data, method, max_key_length, language, key_length) for method in key_methods)
+    if not solutions:
+        raise ValueError("no operation applies to this ciphertext")
+    return sorted(solutions, key=lambda solution: -solution.score)
+
+
+def solve(ciphertext, method=None, max_key_length=60, language='english'):
+    """Best solution for a ciphertext; method=None detects the operation."""
+    return solve_all(ciphertext, [method] if method else None, max_key_length, language)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Break XOR, ADD or Caesar-shift ciphertexts.")
+    parser.add_argument('filename')
+    parser.add_argument('--method', choices=METHODS, help="operation to attack (default: detect)")
+    parser.add_argument('--max-key-length', type=int, default=60)
+    parser.add_argument('--language', default='english', help="language profile, or 'auto'")
+    args = parser.parse_args(argv)
+
+    with open(args.filename, 'rb') as f:
+        ciphertext = f.read()
+    language = None if args.language == 'auto' else args.language
+    solutions = solve_all(ciphertext, [args.method] if args.method else None, args.max_key_length, language)
+    for solution in solutions:
+        key = solution.key.hex() if isinstance(solution.key, bytes) else solution.key
+        print(f"{solution.method:5}  score {solution.score:10.4f}  {solution.language:10}  key {key}")
+    print("\nDecrypted Message:")
+    print(solutions[0].plaintext)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from cryptoanalysis import HISTOGRAM_CHUNK, chi_squared_scores, histogram_buffer, ic_from_histograms, residue_histograms
+from profiles import get_profile
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+def read_encrypted_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield successive chunks of a binary stream until it is exhausted."""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class StreamingAnalyzer:
+    """Incremental key length / key estimation over a ciphertext seen in chunks.
+
+    Keeps one (key_length, 256) histogram per candidate length, all packed in a
+    single flat array, so memory is 256 * 8 * max_key_length * (max_key_length + 1) / 2
+    bytes no matter how much ciphertext has been consumed (about 3.7 MB for 60).
+    """
+
+    def __init__(self, max_key_length, position=0, counts=None):
+        self.max_key_length = max_key_length
+        self.position = position  # number of ciphertext bytes consumed so far
+        size = 256 * max_key_length * (max_key_length + 1) // 2
+        self.counts = np.zeros(size, dtype=np.int64) if counts is None else counts
+        if self.counts.shape != (size,):
+            raise ValueError("histogram state does not match max_key_length")
+        self._buffer = None
+
+    def histograms(self, key_length):
+        """(key_length, 256) view of the running per-residue histograms."""
+        start = 256 * key_length * (key_length - 1) // 2
+        return self.counts[start:start + 256 * key_length].reshape(key_length, 256)
+
+    def update(self, chunk):
+        """Add the next chunk of ciphertext to every histogram."""
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        if len(data) == 0:
+            return
+        if self._buffer is None or len(self._buffer) < min(len(data), HISTOGRAM_CHUNK + self.max_key_length):
+            self._buffer = histogram_buffer(len(data), self.max_key_length)
+        for key_length in range(1, self.max_key_length + 1):
+            chunk_hist = residue_histograms(data, key_length, self._buffer)
+            # Row i of the chunk histogram is absolute residue (position + i) % key_length
+            phase = self.position % key_length
+            self.histograms(key_length)[:] += np.roll(chunk_hist, phase, axis=0)
+        self.position += len(data)
+
+    def key_length_scores(self):
+        """Average IC of every candidate key length, as estimate_key_length returns it."""
+        return [(key_length, float(ic_from_histograms(self.histograms(key_length)).mean()))
+                for key_length in range(1, self.max_key_length + 1)]
+
+    def best_key_length(self):
+        return max(self.key_length_scores(), key=lambda x: x[1])[0]
+
+    def current_key(self, key_length=None, language='english'):
+        """Best key for key_length (default: the current best length) from the histograms so far."""
+        key_length = key_length or self.best_key_length()
+        expected = get_profile(language).byte_expected
+        return bytes(int(np.argmin(chi_squared_scores(hist, expected))) for hist in self.histograms(key_length))
+
+    def save(self, path):
+        """Checkpoint the analyzer state; the file is replaced atomically."""
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, max_key_length=self.max_key_length, position=self.position, counts=self.counts)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as state:
+            return cls(int(state['max_key_length']), int(state['position']), state['counts'].copy())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate a repeating XOR key from a ciphertext stream.")
+    parser.add_argument('filename', nargs='?', default='-', help="ciphertext file, or - for stdin")
+    parser.add_argument('--max-key-length', type=int, default=None,
+                        help="largest key length to consider (default: 60, or the checkpoint's)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--checkpoint', help="state file to resume from and save to")
+    parser.add_argument('--report-every', type=int, default=0,
+                        help="print the current estimate every this many bytes")
+    args = parser.parse_args(argv)
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        analyzer = StreamingAnalyzer.load(args.checkpoint)
+        if args.max_key_length is not None and args.max_key_length != analyzer.max_key_length:
+            parser.error(f"--max-key-length {args.max_key_length} does not match the checkpoint, "
+                         f"which covers key lengths up to {analyzer.max_key_length}")
+        print(f"Resuming at byte {analyzer.position}")
+    else:
+        analyzer = StreamingAnalyzer(args.max_key_length or 60)
+
+    stream = sys.stdin.buffer if args.filename == '-' else open(args.filename, 'rb')
+    try:
+        if args.filename != '-' and analyzer.position:
+            stream.seek(analyzer.position)  # skip what the checkpoint already covers
+        next_report = analyzer.position + args.report_every
+        for chunk in read_encrypted_chunks(stream, args.chunk_size):
+            analyzer.update(chunk)
+            if args.report_every and analyzer.position >= next_report:
+                key_length = analyzer.best_key_length()
+                print(f"{analyzer.position} bytes: key length {key_length}, "
+                      f"key {analyzer.current_key(key_length).hex()}")
+                next_report = analyzer.position + args.report_every
+                if args.checkpoint:
+                    analyzer.save(args.checkpoint)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    if args.checkpoint:
+        analyzer.save(args.checkpoint)
+    key_length = analyzer.best_key_length()
+    print(f"Most likely key length: {key_length}")
+    print(f"Recovered Key (hex): {analyzer.current_key(key_length).hex()}")
+
+
+if __name__ == "__main__":
+    main()
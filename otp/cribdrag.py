@@ -0,0 +1,121 @@
+import argparse
+import heapq
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'languages'))
+from profiles import byte_scores
+
+BATCH_SIZE = 1 << 22  # (pair, offset) scores computed per batch
+
+
+class CribDragger:
+    """Crib dragging over many ciphertexts that were encrypted with the same pad.
+
+    The XOR of every pair of ciphertexts cancels the pad and leaves the XOR of
+    the two plaintexts, so a guessed word (crib) XORed in at the right offset
+    reveals the other message's text there. The pairwise XOR matrix is built
+    once; each crib is then slid over all pairs and offsets in one pass.
+    """
+
+    def __init__(self, ciphertexts, language='english'):
+        self.ciphertexts = [bytes(ciphertext) for ciphertext in ciphertexts]
+        if len(self.ciphertexts) < 2:
+            raise ValueError("crib dragging needs at least two ciphertexts")
+        width = max(len(ciphertext) for ciphertext in self.ciphertexts)
+        padded = np.zeros((len(self.ciphertexts), width), dtype=np.uint8)
+        lengths = np.array([len(ciphertext) for ciphertext in self.ciphertexts])
+        for row, ciphertext in enumerate(self.ciphertexts):
+            padded[row, :len(ciphertext)] = np.frombuffer(ciphertext, dtype=np.uint8)
+        self.first, self.second = np.triu_indices(len(self.ciphertexts), 1)
+        self.xors = padded[self.first] ^ padded[self.second]  # (pair, position)
+        # Both messages must extend past a position for its XOR byte to mean anything
+        self.overlap = np.minimum(lengths[self.first], lengths[self.second])
+        self.scores = byte_scores(language)
+
+    def drag(self, crib, top=20):
+        """Best placements of one crib as (score, i, j, offset, crib, fragment) tuples.
+
+        A hit means one of messages i and j holds crib at offset and the other
+        holds fragment there.
+        """
+        crib = crib.encode('utf-8') if isinstance(crib, str) else bytes(crib)
+        width = self.xors.shape[1] - len(crib) + 1
+        if not crib or width <= 0:
+            return []
+        # Per crib position, the score of every possible XOR byte
+        position_scores = self.scores[np.arange(256)[None, :] ^ np.frombuffer(crib, dtype=np.uint8)[:, None]]
+        pairs_per_batch = max(1, BATCH_SIZE // width)
+        best = []
+        for start in range(0, len(self.xors), pairs_per_batch):
+            xors = self.xors[start:start + pairs_per_batch]
+            total = np.zeros((len(xors), width), dtype=np.float32)
+            for k, table in enumerate(position_scores):
+                total += table[xors[:, k:k + width]]
+            fits = np.arange(width)[None, :] + len(crib) <= self.overlap[start:start + len(xors), None]
+            total[~fits] = -np.inf
+            # The best `top` placements lie in the `top` pairs with the best row maximum
+            rows = total.max(axis=1)
+            if len(rows) > top:
+                rows = np.argpartition(rows, -top)[-top:]
+            else:
+                rows = np.arange(len(rows))
+            candidates = total[rows]
+            count = min(top, candidates.size)
+            for index in np.argpartition(candidates, -count, axis=None)[-count:]:
+                row, offset = divmod(int(index), width)
+                if np.isfinite(candidates[row, offset]):
+                    best.append((float(candidates[row, offset]), start + int(rows[row]), offset))
+            best = heapq.nlargest(top, best)
+        hits = []
+        for score, pair, offset in best:
+            fragment = bytes(self.xors[pair, offset:offset + len(crib)] ^ np.frombuffer(crib, dtype=np.uint8))
+            hits.append((score, int(self.first[pair]), int(self.second[pair]), offset, crib, fragment))
+        return hits
+
+    def drag_all(self, cribs, top=20):
+        """Drag every crib of a dictionary and keep the overall best hits."""
+        hits = []
+        for crib in cribs:
+            hits = heapq.nlargest(top, hits + self.drag(crib, top), key=lambda hit: hit[0])
+        return hits
+
+    def pad_fragment(self, message, offset, plaintext):
+        """Pad bytes at offset, given the plaintext of one message there."""
+        plaintext = plaintext.encode('utf-8') if isinstance(plaintext, str) else bytes(plaintext)
+        ciphertext = self.ciphertexts[message][offset:offset + len(plaintext)]
+        return bytes(c ^ p for c, p in zip(ciphertext, plaintext))
+
+    def decrypt_fragment(self, offset, pad):
+        """Plaintext of every message at offset under a recovered piece of pad."""
+        return [bytes(c ^ p for c, p in zip(ciphertext[offset:offset + len(pad)], pad))
+                for ciphertext in self.ciphertexts]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drag cribs across ciphertexts that reused one pad.")
+    parser.add_argument('ciphertexts', nargs='+', help="ciphertext files")
+    parser.add_argument('--crib', action='append', default=[], help="crib to drag (repeatable)")
+    parser.add_argument('--cribs-file', help="file with one crib per line")
+    parser.add_argument('--language', default='english')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    cribs = list(args.crib)
+    if args.cribs_file:
+        with open(args.cribs_file, encoding='utf-8') as f:
+            cribs.extend(line.rstrip('\n') for line in f if line.strip())
+    ciphertexts = []
+    for filename in args.ciphertexts:
+        with open(filename, 'rb') as f:
+            ciphertexts.append(f.read())
+
+    dragger = CribDragger(ciphertexts, args.language)
+    for score, i, j, offset, crib, fragment in dragger.drag_all(cribs, args.top):
+        print(f"{score:8.2f}  messages {i}/{j}  offset {offset:5}  {crib!r} <-> {fragment!r}")
+
+
+if __name__ == "__main__":
+    main()
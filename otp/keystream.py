@@ -0,0 +1,74 @@
+import mmap
+import os
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 1 MiB per chunk keeps the working set small
+
+METHODS = ('XOR', 'ADD')
+
+
+def _key_tile(key, chunk_size):
+    """Repeat the key just far enough to cover one chunk starting at any key phase."""
+    key = np.frombuffer(key, dtype=np.uint8)
+    if key.size == 0:
+        raise ValueError("key must not be empty")
+    return np.resize(key, chunk_size + key.size), key.size
+
+
+def _apply_chunk(data, key_part, out, method, decrypt):
+    """Combine one chunk with the matching slice of the key tile into out."""
+    if method == 'XOR':
+        np.bitwise_xor(data, key_part, out=out)
+    elif decrypt:
+        np.subtract(data, key_part, out=out)  # uint8 arithmetic wraps modulo 256
+    else:
+        np.add(data, key_part, out=out)
+
+
+def apply_key_into(data, key, out, method='XOR', decrypt=False, offset=0,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """Apply a repeating key to data, writing the result into the out buffer.
+
+    offset is the absolute position of data[0] in the stream, so a message can
+    be processed in pieces and the key stays aligned between calls.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}")
+    data = np.frombuffer(data, dtype=np.uint8)
+    out = np.frombuffer(out, dtype=np.uint8) if not isinstance(out, np.ndarray) else out
+    if out.size < data.size:
+        raise ValueError("output buffer is smaller than the input")
+    tile, key_length = _key_tile(key, min(chunk_size, data.size))
+    for start in range(0, data.size, chunk_size):
+        stop = min(start + chunk_size, data.size)
+        phase = (offset + start) % key_length
+        _apply_chunk(data[start:stop], tile[phase:phase + stop - start],
+                     out[start:stop], method, decrypt)
+    return out
+
+
+def apply_key(data, key, method='XOR', decrypt=False, offset=0,
+              chunk_size=DEFAULT_CHUNK_SIZE):
+    """Apply a repeating key to bytes-like data and return the result as bytes."""
+    out = bytearray(memoryview(data).nbytes)
+    apply_key_into(data, key, out, method, decrypt, offset, chunk_size)
+    return bytes(out)
+
+
+def apply_key_file(src_path, dst_path, key, method='XOR', decrypt=False,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encrypt or decrypt a whole file into another one through memory maps."""
+    size = os.path.getsize(src_path)
+    with open(src_path, 'rb') as src, open(dst_path, 'w+b') as dst:
+        if size == 0:
+            return 0  # mmap cannot map an empty file
+        dst.truncate(size)
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as src_map, \
+                mmap.mmap(dst.fileno(), size) as dst_map:
+            src_view = np.frombuffer(src_map, dtype=np.uint8)
+            dst_view = np.frombuffer(dst_map, dtype=np.uint8)
+            apply_key_into(src_view, key, dst_view, method, decrypt, 0, chunk_size)
+            del src_view, dst_view  # release the exports before the maps close
+            dst_map.flush()
+    return size
@@ -1,5 +1,7 @@
 import os
 
+from keystream import apply_key
+
 def generate_key(key_length):
     """Generate a random key of the specified length."""
     return os.urandom(key_length)
@@ -11,37 +13,30 @@ def extend_key(key, message_length):
 def encrypt(message, key, method='XOR'):
     """Encrypt the message using the key."""
     message_bytes = message.encode('utf-8')
-
-    if method == 'XOR':
-        encrypted_bytes = bytes([m ^ k for m, k in zip(message_bytes, key)])  # XOR operation
-    elif method == 'ADD':
-        encrypted_bytes = bytes([(m + k) % 256 for m, k in zip(message_bytes, key)])  # Addition with overflow handling
-    else:
+    if method not in ('XOR', 'ADD'):
         return -1
-    return encrypted_bytes
+    # The key is repeated over the message without building an extended copy
+    return apply_key(message_bytes, key, method)
 
 def decrypt(encrypted_message, key, method='XOR'):
     """Decrypt the encrypted message using the key."""
-    key = extend_key(key, len(encrypted_message))  # Extend the key to match the message length
-    if method == 'XOR':
-        decrypted_bytes = bytes([e ^ k for e, k in zip(encrypted_message, key)])  # XOR operation
-    elif method == 'ADD':
-        decrypted_bytes = bytes([(e - k) % 256 for e, k in zip(encrypted_message, key)])  # Subtraction to reverse encryption
-    else:
+    if method not in ('XOR', 'ADD'):
         return -1
+    decrypted_bytes = apply_key(encrypted_message, key, method, decrypt=True)
     return decrypted_bytes.decode('utf-8')
 
 
 # Example Usage
-message = "HELLO OTP!"
-short_key = generate_key(3)  # Generate a random key with a shorter length
-print(f"Short Key: {short_key.hex()}")  # Display the short key in hex format
+if __name__ == "__main__":
+    message = "HELLO OTP!"
+    short_key = generate_key(3)  # Generate a random key with a shorter length
+    print(f"Short Key: {short_key.hex()}")  # Display the short key in hex format
 
-encrypted_message = encrypt(message, short_key)
-print(f"Encrypted: {encrypted_message.hex()}")  # Display the ciphertext
+    encrypted_message = encrypt(message, short_key)
+    print(f"Encrypted: {encrypted_message.hex()}")  # Display the ciphertext
 
-decrypted_message = decrypt(encrypted_message, short_key)
-print(f"Decrypted: {decrypted_message}")  # Display the decrypted message
+    decrypted_message = decrypt(encrypted_message, short_key)
+    print(f"Decrypted: {decrypted_message}")  # Display the decrypted message
 
 
 '''
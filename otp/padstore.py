@@ -0,0 +1,204 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+
+from keystream import apply_key
+
+MAGIC = b'OTPPAD01'
+HEADER_SIZE = 4096  # magic + next free offset; pad bytes start after one page
+OFFSET_FORMAT = '<Q'
+OFFSET_POSITION = len(MAGIC)
+FILL_CHUNK = 1 << 20
+
+
+def _write_random(fd, position, size):
+    """Append size bytes from os.urandom at position, one chunk at a time."""
+    written = 0
+    while written < size:
+        chunk = os.urandom(min(FILL_CHUNK, size - written))
+        os.pwrite(fd, chunk, position + written)
+        written += len(chunk)
+
+
+class PadStore:
+    """One-time pad material in a memory-mapped file, handed out exactly once.
+
+    The next free offset lives in the file header and is advanced under a
+    thread lock plus an flock on the file, so threads and processes sharing
+    the file never receive the same pad bytes. A background thread appends
+    fresh random material when less than low_water bytes remain, so callers
+    normally never wait for the entropy source.
+    """
+
+    def __init__(self, path, low_water=16 << 20, refill_size=64 << 20, prefetch=True):
+        self.path = path
+        self.low_water = low_water
+        self.refill_size = refill_size
+        self._fd = os.open(path, os.O_RDWR)
+        self._lock = threading.Lock()
+        self._header = mmap.mmap(self._fd, HEADER_SIZE)
+        if self._header[:len(MAGIC)] != MAGIC:
+            self._header.close()
+            os.close(self._fd)
+            raise ValueError(f"{path} is not a pad store")
+        self._map = None
+        self._mapped_size = 0
+        self._closed = False
+        self._deficit = 0  # bytes a blocked allocate is still missing
+        self._refill_error = None  # exception that stopped the refill thread, raised to waiting allocates
+        self._refill_wanted = threading.Event()
+        self._refilled = threading.Condition(self._lock)
+        self._thread = None
+        if prefetch:
+            self._thread = threading.Thread(target=self._refill_loop, name='pad-refill', daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def create(cls, path, size, **kwargs):
+        """Create a new pad file with size bytes of random material and open it."""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.pwrite(fd, MAGIC + struct.pack(OFFSET_FORMAT, 0), 0)
+            os.ftruncate(fd, HEADER_SIZE)
+            _write_random(fd, HEADER_SIZE, size)
+        finally:
+            os.close(fd)
+        return cls(path, **kwargs)
+
+    def _capacity(self):
+        return os.fstat(self._fd).st_size - HEADER_SIZE
+
+    def _used(self):
+        return struct.unpack_from(OFFSET_FORMAT, self._header, OFFSET_POSITION)[0]
+
+    def remaining(self):
+        """Pad bytes not yet handed out, across every process using the file."""
+        with self._lock:
+            return self._capacity() - self._used()
+
+    def _view(self, offset, size):
+        """Zero-copy view of pad bytes, remapping if the file grew since the last map."""
+        end = HEADER_SIZE + offset + size
+        if end > self._mapped_size:
+            # Views handed out earlier keep the old map alive until they are released
+            self._mapped_size = os.fstat(self._fd).st_size
+            self._map = mmap.mmap(self._fd, self._mapped_size)
+        return memoryview(self._map)[HEADER_SIZE + offset:end]
+
+    def allocate(self, size):
+        """Reserve the next size pad bytes; returns (offset, memoryview).
+
+        Raises ValueError once the store is closed, and the refill thread's
+        exception if it failed while this call was waiting for more material.
+        """
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise ValueError("pad store is closed")
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    offset = self._used()
+                    capacity = self._capacity()
+                    if offset + size <= capacity:
+                        struct.pack_into(OFFSET_FORMAT, self._header, OFFSET_POSITION, offset + size)
+                        break
+                finally:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                if self._thread is None:
+                    # No prefetcher: grow the file here, while still holding the thread lock
+                    self._append(os.urandom(max(self.refill_size, offset + size - capacity)))
+                    continue
+                if self._refill_error is not None:
+                    raise self._refill_error
+                if not self._thread.is_alive():
+                    raise RuntimeError("pad refill thread is not running")
+                self._deficit = max(self._deficit, offset + size - capacity)
+                self._refill_wanted.set()
+                self._refilled.wait(timeout=1.0)
+            if capacity - offset - size < self.low_water:
+                self._refill_wanted.set()
+            return offset, self._view(offset, size)
+
+    def read(self, offset, size):
+        """View of already allocated pad bytes, e.g. to decrypt on the receiving side."""
+        with self._lock:
+            if offset + size > self._used():
+                raise ValueError("pad bytes beyond the allocated offset")
+            return self._view(offset, size)
+
+    def _append(self, material):
+        """Append random material to the file; the caller holds the thread lock.
+
+        flock locks belong to the open file, which every thread of this store
+        shares, so the thread lock must keep them from locking and unlocking
+        each other's flock.
+        """
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            os.pwrite(self._fd, material, os.fstat(self._fd).st_size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _refill_loop(self):
+        try:
+            self._refill()
+        except Exception as error:
+            with self._lock:
+                self._refill_error = error
+                self._refilled.notify_all()
+
+    def _refill(self):
+        while not self._closed:
+            if not self._refill_wanted.wait(timeout=1.0):
+                continue
+            self._refill_wanted.clear()
+            if self._closed:
+                break
+            with self._lock:
+                missing = max(self._deficit, self.low_water - (self._capacity() - self._used()))
+                self._deficit = 0
+            material = os.urandom(max(self.refill_size, missing)) if missing > 0 else None
+            with self._lock:  # entropy is drawn outside the lock, only the write happens under it
+                if material is not None:
+                    self._append(material)
+                self._refilled.notify_all()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._refilled.notify_all()  # blocked allocates raise instead of waiting for material
+        self._refill_wanted.set()
+        if self._thread is not None:
+            self._thread.join()
+        for mapping in (self._map, self._header):
+            if mapping is not None:
+                try:
+                    mapping.close()
+                except BufferError:
+                    pass  # pad views are still in use; the map closes when they are released
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def encrypt_with_pad(store, message, method='XOR'):
+    """Encrypt a message with fresh pad bytes; returns (pad offset, ciphertext)."""
+    message_bytes = message.encode('utf-8')
+    offset, pad = store.allocate(len(message_bytes))
+    if not message_bytes:
+        return offset, b''
+    return offset, apply_key(message_bytes, pad, method)
+
+
+def decrypt_with_pad(store, offset, encrypted_message, method='XOR'):
+    """Decrypt a message given the pad offset it was encrypted at."""
+    if len(encrypted_message) == 0:
+        return ''
+    pad = store.read(offset, len(encrypted_message))
+    return apply_key(encrypted_message, pad, method, decrypt=True).decode('utf-8')
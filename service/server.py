@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for directory in ('cezer', 'otp', 'otp-vigenere', 'languages'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+import cezar
+import cryptoanalysis
+import otp
+from ngram import refine_key
+
+LATENCY_WINDOW = 10000  # most recent requests kept for the percentiles
+DEFAULT_MAX_REQUEST_BYTES = 64 << 20  # longest request line, e.g. a 32 MB ciphertext in hex
+
+
+def caesar_encrypt(request):
+    return {'text': cezar.caesar_cipher(request['text'], int(request['shift']))}
+
+
+def caesar_decrypt(request):
+    return {'text': cezar.caesar_cipher(request['text'], int(request['shift']), encrypt=False)}
+
+
+def caesar_crack(request):
+    ranking = cezar.auto_crack(request['text'], request.get('language', 'spanish'), int(request.get('top', 5)))
+    return {'shifts': [{'shift': shift, 'score': score, 'confidence': confidence, 'language': language}
+                       for shift, score, confidence, language in ranking]}
+
+
+def otp_encrypt(request):
+    encrypted = otp.encrypt(request['message'], bytes.fromhex(request['key']), request.get('method', 'XOR'))
+    if encrypted == -1:
+        raise ValueError("method must be XOR or ADD")
+    return {'ciphertext': encrypted.hex()}
+
+
+def otp_decrypt(request):
+    decrypted = otp.decrypt(bytes.fromhex(request['ciphertext']), bytes.fromhex(request['key']),
+                            request.get('method', 'XOR'))
+    if decrypted == -1:
+        raise ValueError("method must be XOR or ADD")
+    return {'message': decrypted}
+
+
+def xor_crack(request):
+    """Key length estimation, key recovery and refinement; runs in a worker process."""
+    encrypted_text = bytes.fromhex(request['ciphertext'])
+    if not encrypted_text:
+        raise ValueError("empty ciphertext")
+    max_key_length = min(int(request.get('max_key_length', 60)), len(encrypted_text))
+    ics = cryptoanalysis.estimate_key_length(encrypted_text, max_key_length)
+    key_length = max(ics, key=lambda x: x[1])[0]
+    key = cryptoanalysis.recover_key(encrypted_text, key_length)
+    if request.get('refine', True):
+        key = refine_key(encrypted_text, key)
+    return {'key_length': key_length, 'key': key.hex(),
+            'plaintext': cryptoanalysis.decrypt_with_key(encrypted_text, key)}
+
+
+# Cheap operations are coalesced and run batch by batch in a thread; attacks go to processes
+CHEAP_OPERATIONS = {
+    'caesar.encrypt': caesar_encrypt,
+    'caesar.decrypt': caesar_decrypt,
+    'caesar.crack': caesar_crack,
+    'otp.encrypt': otp_encrypt,
+    'otp.decrypt': otp_decrypt,
+}
+HEAVY_OPERATIONS = {
+    'xor.crack': xor_crack,
+}
+
+
+def run_batch(batch):
+    """Run a batch of cheap requests; returns one (ok, payload) pair per request."""
+    results = []
+    for request in batch:
+        try:
+            results.append((True, CHEAP_OPERATIONS[request['op']](request)))
+        except Exception as error:
+            results.append((False, f"{type(error).__name__}: {error}"))
+    return results
+
+
+class CryptoService:
+    """Queue in front of the operations: batches cheap work, offloads attacks, keeps stats."""
+
+    def __init__(self, max_batch=64, batch_window=0.002, workers=None, max_request_bytes=DEFAULT_MAX_REQUEST_BYTES):
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.max_request_bytes = max_request_bytes
+        self.queue = asyncio.Queue()
+        self.processes = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        self.heavy_in_flight = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.counts = collections.Counter()
+        self.batches = 0
+
+    async def submit(self, request):
+        """Queue one request and wait for its (ok, payload) result."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            # Keep collecting until the batch is full or the window closes
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            cheap = []
+            for request, future in batch:
+                try:
+                    op = request['op']
+                    if op in HEAVY_OPERATIONS:
+                        loop.create_task(self.run_heavy(request, future))
+                    elif op in CHEAP_OPERATIONS:
+                        cheap.append((request, future))
+                    else:
+                        future.set_result((False, f"unknown op {op!r}"))
+                except Exception as error:
+                    future.set_result((False, f"{type(error).__name__}: {error}"))
+            if cheap:
+                self.batches += 1
+                try:
+                    results = await loop.run_in_executor(None, run_batch, [request for request, _ in cheap])
+                except Exception as error:
+                    # Never let one batch stop the batcher: fail its requests and carry on
+                    results = [(False, f"{type(error).__name__}: {error}")] * len(cheap)
+                for (_, future), result in zip(cheap, results):
+                    if not future.done():
+                        future.set_result(result)
+
+    async def run_heavy(self, request, future):
+        self.heavy_in_flight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.processes, HEAVY_OPERATIONS[request['op']], request)
+            future.set_result((True, result))
+        except Exception as error:
+            future.set_result((False, f"{type(error).__name__}: {error}"))
+        finally:
+            self.heavy_in_flight -= 1
+
+    def record(self, op, seconds):
+        self.counts[op] += 1
+        self.latencies.append(seconds)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+        return {'queue_depth': self.queue.qsize(), 'heavy_in_flight': self.heavy_in_flight,
+                'batches': self.batches, 'requests': dict(self.counts),
+                'latency_ms': {'p50': percentile(50), 'p95': percentile(95), 'p99': percentile(99)}}
+
+    async def handle_request(self, line, writer, write_lock):
+        started = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            if not isinstance(request.get('op'), str):
+                raise ValueError("op must be a string")
+            if request.get('op') == 'stats':
+                ok, payload = True, self.stats()
+            else:
+                ok, payload = await self.submit(request)
+        except (ValueError, AttributeError) as error:
+            request = {}
+            ok, payload = False, f"bad request: {error}"
+        await self.respond(writer, write_lock, {'id': request_id, 'ok': ok, ('result' if ok else 'error'): payload})
+        self.record(request.get('op', 'invalid'), time.perf_counter() - started)
+
+    async def respond(self, writer, write_lock, response):
+        async with write_lock:
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+
+    async def read_request(self, reader):
+        """Next request line (b'' at end of stream); an oversized line is discarded and raises ValueError."""
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as error:
+            return error.partial  # last line without a newline
+        except asyncio.LimitOverrunError as error:
+            discard = error.consumed
+        # Skip the rest of the oversized line so the next request starts cleanly
+        while True:
+            await reader.readexactly(discard)
+            try:
+                await reader.readuntil(b'\n')
+                break
+            except asyncio.IncompleteReadError:
+                break
+            except asyncio.LimitOverrunError as error:
+                discard = error.consumed
+        raise ValueError("request too large")
+
+    async def handle_client(self, reader, writer):
+        """One JSON request per line; responses carry the request id and may arrive out of order."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await self.read_request(reader)
+                except ValueError as error:
+                    await self.respond(writer, write_lock, {'id': None, 'ok': False, 'error': str(error)})
+                    self.record('invalid', 0.0)
+                    continue
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.handle_request(line, writer, write_lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        batcher = asyncio.create_task(self.batcher())
+        server = await asyncio.start_server(self.handle_client, host, port, limit=self.max_request_bytes)
+        print(f"Listening on {', '.join(str(sock.getsockname()) for sock in server.sockets)}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.processes.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Caesar/OTP encryption and XOR cracking over TCP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--batch-window', type=float, default=0.002, help="seconds to wait for a batch to fill")
+    parser.add_argument('--workers', type=int, default=None, help="processes for cracking requests")
+    parser.add_argument('--max-request-bytes', type=int, default=DEFAULT_MAX_REQUEST_BYTES,
+                        help="longest request line accepted; longer ones are answered with an error")
+    args = parser.parse_args(argv)
+
+    service = CryptoService(args.max_batch, args.batch_window, args.workers, args.max_request_bytes)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()